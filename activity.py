@@ -0,0 +1,69 @@
+# activity.py
+import time
+from collections import OrderedDict
+
+class _ChannelActivity:
+    __slots__ = ('last_author', 'last_time', 'prev_author', 'prev_time')
+
+    def __init__(self, author_id, now):
+        self.last_author = author_id
+        self.last_time = now
+        self.prev_author = None
+        self.prev_time = 0.0
+
+class ActivityTracker:
+    """Recent-speaker tracking per channel, for the "someone else is talking" check.
+
+    Only the two most recent distinct authors of each channel are kept, which is enough to
+    answer "has anyone other than X spoken in the last `window` seconds" in O(1). Channels
+    are kept in last-active order, so expired channels are always at the front and eviction
+    never scans live ones.
+    """
+
+    def __init__(self, window=5.0):
+        self.window = window
+        self.channels = OrderedDict()  # channel_id -> _ChannelActivity
+        self.evictions = 0
+
+    def record(self, channel_id, author_id, now=None):
+        now = time.monotonic() if now is None else now
+        activity = self.channels.get(channel_id)
+        if activity is None:
+            self.channels[channel_id] = _ChannelActivity(author_id, now)
+        else:
+            if activity.last_author != author_id:
+                activity.prev_author = activity.last_author
+                activity.prev_time = activity.last_time
+                activity.last_author = author_id
+            activity.last_time = now
+            self.channels.move_to_end(channel_id)
+        # Amortized expiry: each insert retires at most a couple of stale channels
+        self._expire(now, limit=2)
+
+    def other_author_active(self, channel_id, author_id, now=None):
+        """True if someone other than author_id spoke in the channel within the window."""
+        activity = self.channels.get(channel_id)
+        if activity is None:
+            return False
+        now = time.monotonic() if now is None else now
+        if activity.last_author != author_id:
+            return now - activity.last_time < self.window
+        return activity.prev_author is not None and now - activity.prev_time < self.window
+
+    def _expire(self, now, limit=None):
+        evicted = 0
+        while self.channels and (limit is None or evicted < limit):
+            channel_id, activity = next(iter(self.channels.items()))
+            if now - activity.last_time < self.window:
+                break
+            del self.channels[channel_id]
+            evicted += 1
+        self.evictions += evicted
+        return evicted
+
+    def sweep(self, now=None):
+        """Evict every channel that has been quiet for the whole window. Returns how many."""
+        return self._expire(time.monotonic() if now is None else now)
+
+    def __len__(self):
+        return len(self.channels)
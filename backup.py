@@ -0,0 +1,122 @@
+# backup.py
+import datetime
+import os
+import sqlite3
+import threading
+import time
+from config import BACKUP_DIR, BACKUP_INTERVAL_SECONDS, BACKUP_DIRTY_WRITES, BACKUP_KEEP, logger
+import database
+from metrics import metrics
+
+def create_backup(source_file, backup_dir, keep):
+    """Snapshot source_file into backup_dir with SQLite's online backup API and rotate old snapshots.
+
+    The copy is taken in one step from a consistent read transaction, so it never contains a
+    half-written page even while the bot keeps writing. In WAL mode that reader doesn't block
+    the writer; copying in small steps instead would restart from the first page after every
+    commit from another connection, and never finish under steady write load. Returns the
+    path of the new snapshot.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    base = os.path.splitext(os.path.basename(source_file))[0]
+    stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    backup_file = os.path.join(backup_dir, f"{base}-{stamp}.db")
+    tmp_file = f"{backup_file}.tmp"
+
+    source = sqlite3.connect(source_file)
+    dest = sqlite3.connect(tmp_file)
+    try:
+        source.backup(dest, pages=-1)
+    finally:
+        dest.close()
+        source.close()
+    os.replace(tmp_file, backup_file)
+
+    snapshots = sorted(
+        name for name in os.listdir(backup_dir)
+        if name.startswith(f"{base}-") and name.endswith('.db')
+    )
+    for name in snapshots[:-keep] if keep > 0 else []:
+        try:
+            os.remove(os.path.join(backup_dir, name))
+        except OSError as e:
+            logger.warning(f"Could not remove old backup {name}: {e}")
+    return backup_file
+
+class BackupScheduler(threading.Thread):
+    """Background thread that backs up the database on an interval or after enough dirty writes.
+
+    Nothing here touches the event loop: the database worker reports committed writes through
+    a write listener, and the backup itself runs on this thread with its own connection.
+    """
+
+    def __init__(self, source_file=None, backup_dir=BACKUP_DIR, interval=BACKUP_INTERVAL_SECONDS,
+                 dirty_threshold=BACKUP_DIRTY_WRITES, keep=BACKUP_KEEP):
+        super().__init__(name='sydney-backup', daemon=True)
+        self.source_file = source_file or database.DATABASE_FILE
+        self.backup_dir = backup_dir
+        self.interval = interval
+        self.dirty_threshold = dirty_threshold
+        self.keep = keep
+        self.dirty_writes = 0
+        self.last_backup = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+
+    def mark_dirty(self, count=1):
+        with self._lock:
+            self.dirty_writes += count
+            if self.dirty_writes >= self.dirty_threshold:
+                self._wake.set()
+
+    def run(self):
+        database.add_write_listener(self.mark_dirty)
+        try:
+            while True:
+                self._wake.wait(timeout=self.interval)
+                self._wake.clear()
+                if self.dirty_writes:
+                    self._backup()
+                if self._stopping:
+                    break
+        finally:
+            database.remove_write_listener(self.mark_dirty)
+
+    def _backup(self):
+        with self._lock:
+            dirty, self.dirty_writes = self.dirty_writes, 0
+        started = time.monotonic()
+        try:
+            backup_file = create_backup(self.source_file, self.backup_dir, self.keep)
+        except Exception as e:
+            logger.error(f"Database backup failed: {e}", exc_info=True)
+            with self._lock:
+                self.dirty_writes += dirty  # Try again on the next wake-up
+            return
+        self.last_backup = time.time()
+        metrics.observe('backup_seconds', time.monotonic() - started)
+        logger.info(f"Database backup created at {backup_file} ({dirty} writes, {time.monotonic() - started:.2f}s).")
+
+    def stop(self):
+        """Ask the thread to take a final backup if dirty, then exit."""
+        self._stopping = True
+        self._wake.set()
+
+_scheduler = None
+
+def start_backup_scheduler():
+    global _scheduler
+    if _scheduler is None or not _scheduler.is_alive():
+        _scheduler = BackupScheduler()
+        _scheduler.start()
+        logger.info(f"Backup scheduler started (every {_scheduler.interval}s or {_scheduler.dirty_threshold} writes).")
+    return _scheduler
+
+def stop_backup_scheduler(timeout=None):
+    """Stop the scheduler, blocking until its final backup finishes. Call via asyncio.to_thread."""
+    global _scheduler
+    scheduler, _scheduler = _scheduler, None
+    if scheduler is not None and scheduler.is_alive():
+        scheduler.stop()
+        scheduler.join(timeout)
@@ -0,0 +1,8 @@
+# benchmarks/__init__.py
+"""Offline benchmarks; run from the repository root.
+
+    python -m benchmarks.load_test   # on_message end to end against a stub backend
+    python -m benchmarks.micro       # mention rewriting, trigger matching, database calls
+
+Pass --output bench_output.txt to keep a running log (the file is gitignored).
+"""
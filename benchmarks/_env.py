@@ -0,0 +1,61 @@
+# benchmarks/_env.py
+"""Environment for offline benchmarks. Import this before any bot module.
+
+config.py reads the environment at import time, so the fake credentials, the stub backend
+URL, a disabled metrics endpoint and a scratch working directory (for logs/ and the SQLite
+file) are set up here. Anything already set in the environment wins.
+"""
+import os
+import socket
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BENCH_ENV = {
+    "DISCORD_TOKEN": "benchmark",
+    "OPENPIPE_API_KEY": "benchmark",
+    "OPENPIPE_API_KEY_EXPENSIVE": "benchmark",
+    "METRICS_PORT": "0",
+    "HEDGE_REQUESTS": "false",
+    "STREAM_REPLIES": "false",
+    "REPLY_DEBOUNCE_SECONDS": "0.05",
+    # Production rate limits would drop most synthetic traffic; measure the pipeline instead
+    "RATE_LIMIT_USER_PER_MINUTE": "1000000",
+    "RATE_LIMIT_USER_BURST": "1000000",
+    "RATE_LIMIT_CHANNEL_PER_MINUTE": "1000000",
+    "RATE_LIMIT_CHANNEL_BURST": "1000000",
+    "RATE_LIMIT_GUILD_PER_MINUTE": "1000000",
+    "RATE_LIMIT_GUILD_BURST": "1000000",
+    "SCHEDULER_SHED_DEPTH": "1000000",
+    "SCHEDULER_MAX_QUEUE": "1000000",
+}
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+for key, value in BENCH_ENV.items():
+    os.environ.setdefault(key, value)
+
+# The stub completion backend listens here (see stub_backend.py)
+STUB_PORT = _free_port()
+os.environ.setdefault("OPENPIPE_BASE_URL", f"http://127.0.0.1:{STUB_PORT}")
+
+ORIGINAL_CWD = os.getcwd()
+WORK_DIR = tempfile.mkdtemp(prefix="sydney-bench-")
+os.chdir(WORK_DIR)
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+import logging  # noqa: E402
+import config  # noqa: E402
+
+# The file handler stays as in production; only the console is quietened
+config.console_handler.setLevel(logging.WARNING)
+
+def append_report(path, report):
+    """Append a report to `path`, resolved against the directory the benchmark was started from."""
+    with open(os.path.join(ORIGINAL_CWD, path), "a", encoding="utf-8") as f:
+        f.write(report + "\n")
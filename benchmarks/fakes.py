@@ -0,0 +1,121 @@
+# benchmarks/fakes.py
+"""Minimal stand-ins for the discord.py objects SydneyCog touches.
+
+Only the attributes and coroutines the cog actually uses are implemented. Sends, replies,
+edits and reactions are recorded with timestamps instead of going to Discord.
+"""
+import itertools
+import random
+import time
+
+_ids = itertools.count(10**17)
+
+def next_id():
+    return next(_ids)
+
+class FakeUser:
+    def __init__(self, name, display_name=None, bot=False, guild=None):
+        self.id = next_id()
+        self.name = name
+        self.display_name = display_name or name
+        self.bot = bot
+        self.guild = guild
+        self.mention = f"<@{self.id}>"
+
+    def __str__(self):
+        return self.name
+
+class FakeGuild:
+    def __init__(self, name, member_count, seed=0):
+        self.id = next_id()
+        self.name = name
+        rng = random.Random(seed)
+        self.members = [
+            FakeUser(f"user{i}", display_name=f"{rng.choice(_NAME_PARTS)}{rng.choice(_NAME_PARTS)}{i}", guild=self)
+            for i in range(member_count)
+        ]
+        self._by_id = {member.id: member for member in self.members}
+        self.member_count = member_count
+
+    def get_member(self, user_id):
+        return self._by_id.get(user_id)
+
+_NAME_PARTS = ["Luna", "Kai", "Nova", "Rex", "Ivy", "Zed", "Orion", "Mira", "Sol", "Echo", "Pixel", "Ash"]
+
+class _Typing:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+class Recorder:
+    """Collects everything the bot posts, with reply latency measured from message creation."""
+
+    def __init__(self):
+        self.sent = 0
+        self.replies = 0
+        self.edits = 0
+        self.reactions = 0
+        self.reply_latencies = []
+
+    def reply(self, message):
+        self.replies += 1
+        self.reply_latencies.append(time.perf_counter() - message.created)
+
+class FakeSentMessage:
+    def __init__(self, recorder, content):
+        self.recorder = recorder
+        self.content = content
+
+    async def edit(self, content=None, **kwargs):
+        self.recorder.edits += 1
+        self.content = content
+
+class FakeChannel:
+    def __init__(self, name, guild, recorder):
+        self.id = next_id()
+        self.name = name
+        self.guild = guild
+        self.recorder = recorder
+
+    def typing(self):
+        return _Typing()
+
+    async def send(self, content=None, **kwargs):
+        self.recorder.sent += 1
+        return FakeSentMessage(self.recorder, content)
+
+class FakeMessage:
+    def __init__(self, author, channel, content, mentions=()):
+        self.id = next_id()
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.content = content
+        self.clean_content = content
+        self.mentions = list(mentions)
+        self.created = time.perf_counter()
+
+    async def reply(self, content=None, **kwargs):
+        self.channel.recorder.reply(self)
+        return FakeSentMessage(self.channel.recorder, content)
+
+    async def add_reaction(self, emoji):
+        self.channel.recorder.reactions += 1
+
+class FakeBot:
+    def __init__(self, guilds):
+        self.user = FakeUser("SydneyBot", bot=True)
+        self.guilds = guilds
+        self.command_prefix = 's!'
+
+    async def process_commands(self, message):
+        pass
+
+    async def change_presence(self, **kwargs):
+        pass
+
+    def get_all_members(self):
+        for guild in self.guilds:
+            yield from guild.members
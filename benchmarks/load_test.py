@@ -0,0 +1,178 @@
+# benchmarks/load_test.py
+"""Drive SydneyCog.on_message with synthetic traffic against a stub completion backend.
+
+Reports on_message throughput, reply latency percentiles, event-loop lag and memory.
+
+    python -m benchmarks.load_test --messages 5000 --members 20000 --latency 0.3
+    python -m benchmarks.load_test --output bench_output.txt   # also append the report to a file
+"""
+from benchmarks import _env  # noqa: F401  (must come first: sets up config's environment)
+
+import argparse
+import asyncio
+import random
+import resource
+import time
+
+from benchmarks.fakes import FakeBot, FakeChannel, FakeGuild, FakeMessage, Recorder
+from benchmarks.stub_backend import StubBackend
+from database import init_database, save_probabilities
+from cogs.sydney_cog import SydneyCog
+from scheduler import scheduler
+
+WORDS = (
+    "lol what do you think about this honestly the new update is kind of wild "
+    "anyone up for games tonight i cant believe that happened brb coffee"
+).split()
+
+def percentile(samples, p):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+def rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # ru_maxrss is KiB on Linux
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes a task that asked to sleep `interval`."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - started - self.interval))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        self._task.cancel()
+
+def build_world(args, recorder):
+    guilds = [FakeGuild(f"guild{g}", args.members, seed=g) for g in range(args.guilds)]
+    channels = [
+        FakeChannel(f"chat{c}", guild, recorder)
+        for guild in guilds
+        for c in range(args.channels)
+    ]
+    return guilds, channels
+
+def make_message(rng, args, bot, channel, authors):
+    author = rng.choice(authors[channel.id])
+    words = rng.choices(WORDS, k=rng.randint(3, 20))
+    mentions = []
+    roll = rng.random()
+    if roll < args.mention_rate:
+        mentions.append(bot.user)
+        words.insert(0, bot.user.mention)
+    elif roll < args.mention_rate + args.trigger_rate:
+        words.insert(rng.randint(0, len(words)), "sydney")
+    return FakeMessage(author, channel, " ".join(words), mentions)
+
+async def wait_for_drain(cog, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if not cog.dispatcher.channels and scheduler.running == 0 and scheduler.waiting == 0:
+            return True
+        await asyncio.sleep(0.05)
+    return False
+
+async def run(args):
+    rng = random.Random(args.seed)
+    recorder = Recorder()
+    guilds, channels = build_world(args, recorder)
+    member_names = [member.display_name for member in rng.sample(guilds[0].members, min(200, args.members))]
+    backend = StubBackend(
+        latency=args.latency, jitter=args.jitter, refusal_rate=args.refusal_rate,
+        error_rate=args.error_rate, member_names=member_names, seed=args.seed
+    )
+    await backend.start(_env.STUB_PORT)
+    bot = FakeBot(guilds)
+
+    await init_database()
+    for channel in channels:
+        await save_probabilities(str(channel.guild.id), channel.id, args.reply_probability, args.reaction_probability)
+    # Each channel gets a small, fixed set of speakers; busy multi-author channels suppress replies
+    authors = {channel.id: rng.sample(channel.guild.members, args.authors_per_channel) for channel in channels}
+
+    cog = SydneyCog(bot)
+    await cog.cog_load()
+    rss_before = rss_mb()
+    lag = LoopLagMonitor()
+    lag.start()
+
+    handled = []
+
+    async def handle(message):
+        started = time.perf_counter()
+        await cog.on_message(message)
+        handled.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    tasks = []
+    for i in range(args.messages):
+        tasks.append(asyncio.create_task(handle(make_message(rng, args, bot, rng.choice(channels), authors))))
+        if args.rate:
+            await asyncio.sleep(1.0 / args.rate)
+        elif i % 100 == 99:
+            await asyncio.sleep(0)  # Let the gateway-side work interleave as it would live
+    await asyncio.gather(*tasks)
+    ingest_seconds = time.perf_counter() - started
+    drained = await wait_for_drain(cog, args.drain_timeout)
+    total_seconds = time.perf_counter() - started
+    lag.stop()
+
+    report = [
+        f"load_test: {args.messages} messages, {args.guilds} guilds x {args.members} members, "
+        f"{args.channels} channels/guild, stub latency {args.latency}s, refusal rate {args.refusal_rate}",
+        f"  on_message throughput: {args.messages / ingest_seconds:,.0f} msg/s "
+        f"(p50 {percentile(handled, 0.5) * 1000:.2f} ms, p99 {percentile(handled, 0.99) * 1000:.2f} ms per call)",
+        f"  replies: {recorder.replies} ({recorder.replies / total_seconds:.1f}/s), reactions: {recorder.reactions}, "
+        f"backend requests: {backend.requests}, refusals served: {backend.refusals}"
+        + ("" if drained else " [did not drain]"),
+        f"  reply latency: p50 {percentile(recorder.reply_latencies, 0.5) * 1000:.0f} ms, "
+        f"p99 {percentile(recorder.reply_latencies, 0.99) * 1000:.0f} ms",
+        f"  event-loop lag: p50 {percentile(lag.samples, 0.5) * 1000:.2f} ms, "
+        f"p99 {percentile(lag.samples, 0.99) * 1000:.2f} ms, max {max(lag.samples, default=0) * 1000:.2f} ms",
+        f"  memory: peak RSS {rss_mb():.0f} MiB ({rss_mb() - rss_before:+.0f} MiB during run), "
+        f"history {cog.history.memory_usage()['bytes'] / 1024:.0f} KiB",
+    ]
+
+    await cog.cog_unload()
+    await backend.stop()
+    return "\n".join(report)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--guilds", type=int, default=3)
+    parser.add_argument("--members", type=int, default=10000, help="members per guild")
+    parser.add_argument("--channels", type=int, default=20, help="channels per guild")
+    parser.add_argument("--authors-per-channel", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=0, help="messages per second (0 = as fast as possible)")
+    parser.add_argument("--latency", type=float, default=0.2, help="stub completion latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--refusal-rate", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--mention-rate", type=float, default=0.1)
+    parser.add_argument("--trigger-rate", type=float, default=0.1)
+    parser.add_argument("--reply-probability", type=float, default=0.1)
+    parser.add_argument("--reaction-probability", type=float, default=0.2)
+    parser.add_argument("--drain-timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="append the report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(report)
+    if args.output:
+        _env.append_report(args.output, report)
+
+if __name__ == "__main__":
+    main()
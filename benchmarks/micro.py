@@ -0,0 +1,142 @@
+# benchmarks/micro.py
+"""Microbenchmarks for the per-message hot paths.
+
+    python -m benchmarks.micro
+    python -m benchmarks.micro --members 50000 --output bench_output.txt
+"""
+from benchmarks import _env  # noqa: F401  (must come first: sets up config's environment)
+
+import argparse
+import asyncio
+import random
+import time
+
+from benchmarks.fakes import FakeGuild
+from database import (
+    init_database,
+    close_database,
+    load_probabilities,
+    save_probabilities,
+    load_user_preference,
+    save_user_preference,
+    enqueue_history_append,
+    load_history,
+    probabilities_cache,
+    user_preferences_cache,
+    run_read
+)
+from history_store import HistoryRecord
+from mentions import mention_index, replace_usernames_with_mentions
+from triggers import TriggerMatcher, TriggerRegistry
+
+def bench(name, fn, min_seconds=0.5):
+    """Time a synchronous callable; returns a report line."""
+    fn()  # Warm up
+    runs = 0
+    started = time.perf_counter()
+    while True:
+        fn()
+        runs += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            break
+    return f"  {name:<52} {elapsed / runs * 1e6:>10.2f} µs/op {runs / elapsed:>12,.0f} ops/s"
+
+async def abench(name, fn, min_seconds=0.5):
+    """Time a coroutine function; returns a report line."""
+    await fn()
+    runs = 0
+    started = time.perf_counter()
+    while True:
+        await fn()
+        runs += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            break
+    return f"  {name:<52} {elapsed / runs * 1e6:>10.2f} µs/op {runs / elapsed:>12,.0f} ops/s"
+
+def bench_mentions(args, rng):
+    guild = FakeGuild("bench", args.members, seed=args.seed)
+    author = guild.members[0]
+    names = [member.display_name for member in rng.sample(guild.members, 5)]
+    reply = f"Sydney: hey {names[0]}! did you see what {names[1]} said? *ping* {names[2]} lol"
+    plain = "Sydney: honestly that's a pretty good question, let me think about it for a second"
+
+    started = time.perf_counter()
+    asyncio.run(mention_index.prepare(guild))  # In a worker thread, as on a guild's first reply
+    lines = [f"  {'mention index build (' + str(args.members) + ' members)':<52} {(time.perf_counter() - started) * 1000:>10.2f} ms"]
+    lines.append(bench("replace_usernames_with_mentions (3 names)", lambda: replace_usernames_with_mentions(reply, guild, author)))
+    lines.append(bench("replace_usernames_with_mentions (no names)", lambda: replace_usernames_with_mentions(plain, guild, author)))
+    return lines
+
+DEFAULT_TRIGGER_WORDS = ["sydney", "syd", "s!talk", "sydneybot#3817"]
+DEFAULT_EXPENSIVE_TRIGGER_WORDS = ["xxx"]
+TRIGGER_HIT = "honestly i think sydney would know the answer to this one"
+TRIGGER_MISS = "honestly i think nobody would know the answer to this one, it is a long message " * 3
+
+def bench_triggers():
+    matcher = TriggerMatcher(DEFAULT_TRIGGER_WORDS, DEFAULT_EXPENSIVE_TRIGGER_WORDS)
+    large = TriggerMatcher(DEFAULT_TRIGGER_WORDS + [f"word{i}" for i in range(200)], DEFAULT_EXPENSIVE_TRIGGER_WORDS)
+    return [
+        bench("TriggerMatcher.classify (5 words, hit)", lambda: matcher.classify(TRIGGER_HIT)),
+        bench("TriggerMatcher.classify (5 words, miss)", lambda: matcher.classify(TRIGGER_MISS)),
+        bench("TriggerMatcher.classify (205 words, miss)", lambda: large.classify(TRIGGER_MISS)),
+    ]
+
+async def bench_database(rng):
+    await init_database()
+    guild_id, channel_id = "1", 2
+    await save_probabilities(guild_id, channel_id, 0.2, 0.3)
+    await save_user_preference(3, "hey")
+    triggers = TriggerRegistry(DEFAULT_TRIGGER_WORDS, DEFAULT_EXPENSIVE_TRIGGER_WORDS)
+
+    async def load_probabilities_uncached():
+        probabilities_cache.clear()
+        await load_probabilities(guild_id, channel_id)
+
+    async def load_user_preference_uncached():
+        user_preferences_cache.clear()
+        await load_user_preference(3)
+
+    async def save_probabilities_write():
+        await save_probabilities(guild_id, channel_id, rng.random(), None)
+
+    async def history_append_batch():
+        # enqueue_history_append does not wait; measure 100 appends until the last one commits
+        future = None
+        for i in range(100):
+            future = enqueue_history_append(guild_id, channel_id, HistoryRecord("user", f"bench: message {i}", time.time(), 5), 50)
+        await future
+
+    lines = [
+        await abench("load_probabilities (cached)", lambda: load_probabilities(guild_id, channel_id)),
+        await abench("load_probabilities (uncached)", load_probabilities_uncached),
+        await abench("load_user_preference (uncached)", load_user_preference_uncached),
+        await abench("save_probabilities", save_probabilities_write),
+        await abench("enqueue_history_append x100 (until committed)", history_append_batch),
+        await abench("load_history (50 rows)", lambda: load_history(guild_id, channel_id, 50)),
+        await abench("run_read round trip (SELECT 1)", lambda: run_read(lambda conn: conn.execute("SELECT 1").fetchone())),
+        await abench("TriggerRegistry.classify (matcher cached, miss)", lambda: triggers.classify(guild_id, TRIGGER_MISS)),
+    ]
+    await close_database()
+    return lines
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=20000, help="guild size for mention rewriting")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="append the report to this file")
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    report = ["micro:"]
+    report += bench_mentions(args, rng)
+    report += bench_triggers()
+    report += asyncio.run(bench_database(rng))
+    report = "\n".join(report)
+    print(report)
+    if args.output:
+        _env.append_report(args.output, report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# benchmarks/stub_backend.py
+"""Local stand-in for the OpenPipe chat-completions API.
+
+Answers with canned replies after a configurable latency and refuses a configurable fraction
+of requests, so the refusal/escalation paths get exercised. Streaming requests get SSE chunks.
+"""
+import asyncio
+import json
+import random
+from aiohttp import web
+
+REFUSAL = "I'm sorry, I can't help with that."
+REACTIONS = ["😂", "❤️", "👀", "🔥", "😭"]
+
+class StubBackend:
+    def __init__(self, latency=0.2, jitter=0.1, refusal_rate=0.05, error_rate=0.0, member_names=(), seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.refusal_rate = refusal_rate
+        self.error_rate = error_rate
+        self.member_names = list(member_names)  # Sprinkled into replies to exercise mention rewriting
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.refusals = 0
+        self._runner = None
+
+    def _reply_text(self, payload):
+        system = payload["messages"][0]["content"] if payload.get("messages") else ""
+        if "single emoji" in system:
+            return self.random.choice(REACTIONS)
+        # CSRv2 never refuses, so escalation always ends the retry loop
+        if payload.get("model", "").endswith("Sydney-Court") and self.random.random() < self.refusal_rate:
+            self.refusals += 1
+            return REFUSAL
+        names = self.random.sample(self.member_names, min(2, len(self.member_names)))
+        greeting = f"hey {names[0]}! " if names else "hey! "
+        tail = f" *ping* {names[1]} what do you think?" if len(names) > 1 else ""
+        return f"Sydney: {greeting}that's a really interesting point, tell me more.{tail}"
+
+    async def _handle(self, request):
+        self.requests += 1
+        payload = await request.json()
+        await asyncio.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+        if self.random.random() < self.error_rate:
+            return web.Response(status=503, text="stub overloaded")
+        text = self._reply_text(payload)
+        if not payload.get("stream"):
+            return web.json_response({"choices": [{"message": {"role": "assistant", "content": text}}]})
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        try:
+            for start in range(0, len(text), 12):
+                chunk = {"choices": [{"delta": {"content": text[start:start + 12]}}]}
+                await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                await asyncio.sleep(0.005)
+            await response.write(b"data: [DONE]\n\n")
+        except ConnectionResetError:
+            pass  # The bot closed the stream (a superseded or hedged reply)
+        return response
+
+    async def start(self, port, host="127.0.0.1"):
+        app = web.Application()
+        app.router.add_post("/chat/completions", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
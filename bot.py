@@ -1,27 +1,46 @@
 # bot.py
 import discord
 from discord.ext import commands
-from config import DISCORD_TOKEN, logger
+from config import DISCORD_TOKEN, LOW_MEMORY_MODE, CLUSTER_ID, logger
 from database import init_database
+from backup import start_backup_scheduler
 from cogs.sydney_cog import SydneyCog
 
-intents = discord.Intents.default()
-intents.messages = True
-intents.guilds = True
-intents.members = True
-intents.message_content = True  # Required to read message content
-intents.dm_messages = True
+def create_bot(shard_ids=None, shard_count=None):
+    """Build the bot. With shard_ids/shard_count it is an AutoShardedBot owning just those shards."""
+    intents = discord.Intents.default()
+    intents.messages = True
+    intents.guilds = True
+    intents.members = True
+    intents.message_content = True  # Required to read message content
+    intents.dm_messages = True
 
-bot = commands.Bot(command_prefix='s!', intents=intents)
+    options = {"command_prefix": 's!', "intents": intents}
+    if LOW_MEMORY_MODE:
+        # Keep member events (intents.members) but cache no members and don't chunk guilds at startup
+        options["member_cache_flags"] = discord.MemberCacheFlags.none()
+        options["chunk_guilds_at_startup"] = False
 
-@bot.event
-async def on_ready():
-    logger.info(f"Logged in as {bot.user}")
-    init_database()
-    await bot.add_cog(SydneyCog(bot))
+    if shard_ids is not None or shard_count is not None:
+        bot = commands.AutoShardedBot(shard_ids=shard_ids, shard_count=shard_count, **options)
+    else:
+        bot = commands.Bot(**options)
+
+    @bot.event
+    async def on_ready():
+        logger.info(f"Logged in as {bot.user}" + (f" with shards {sorted(bot.shards)}" if bot.shard_count else ""))
+        if bot.get_cog('SydneyCog') is not None:
+            return  # on_ready fires again after a reconnect
+        await init_database()
+        if CLUSTER_ID in (None, 0):
+            # One backup scheduler per database file; it also sees the other clusters' commits
+            start_backup_scheduler()
+        await bot.add_cog(SydneyCog(bot))
+
+    return bot
 
 if __name__ == '__main__':
     try:
-        bot.run(DISCORD_TOKEN)
+        create_bot().run(DISCORD_TOKEN)
     except Exception as e:
-        logger.critical(f"Failed to start the bot: {e}")
\ No newline at end of file
+        logger.critical(f"Failed to start the bot: {e}")
@@ -0,0 +1,137 @@
+# circuit_breaker.py
+import random
+import time
+from collections import deque
+from config import logger
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} circuit is open; retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """Error-rate and latency circuit breaker for one upstream dependency.
+
+    The breaker opens when, over the last `window` calls (at least `min_calls`), the failure
+    rate or the slow-call rate crosses its threshold. While open every call fails fast. After
+    a jittered, exponentially growing backoff it goes half-open and lets `half_open_probes`
+    calls through; their success closes the circuit, any failure re-opens it for longer.
+    """
+
+    def __init__(self, name, window=50, min_calls=10, error_rate=0.5, slow_call_seconds=30.0,
+                 slow_call_rate=0.8, open_seconds=5.0, max_open_seconds=300.0, half_open_probes=1):
+        self.name = name
+        self.outcomes = deque(maxlen=window)  # (failed, slow)
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self.open_until = 0.0
+        self.consecutive_opens = 0
+        self.probes_in_flight = 0
+        self.rejected = 0
+        self.opened = 0
+
+    def before_call(self):
+        """Return a call token, or raise CircuitOpenError to fail fast."""
+        now = time.monotonic()
+        if self.state == OPEN:
+            if now < self.open_until:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, self.open_until - now)
+            self.state = HALF_OPEN
+            self.probes_in_flight = 0
+            logger.info(f"{self.name} circuit half-open; probing.")
+        if self.state == HALF_OPEN:
+            if self.probes_in_flight >= self.half_open_probes:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, 0.0)
+            self.probes_in_flight += 1
+            return (now, True)
+        return (now, False)
+
+    def record_success(self, token, duration=None):
+        started, probe = token
+        duration = time.monotonic() - started if duration is None else duration
+        slow = duration >= self.slow_call_seconds
+        if probe:
+            self.probes_in_flight -= 1
+            if slow:
+                self._open("slow probe")
+            else:
+                self._close()
+            return
+        self._record(False, slow)
+
+    def record_failure(self, token):
+        started, probe = token
+        if probe:
+            self.probes_in_flight -= 1
+            self._open("failed probe")
+            return
+        self._record(True, time.monotonic() - started >= self.slow_call_seconds)
+
+    def record_cancelled(self, token):
+        """Release a call that says nothing about upstream health: cancelled before an answer,
+        or rejected as our own bad request. A probe's slot is freed without closing or
+        re-opening the circuit, and nothing enters the outcome window."""
+        started, probe = token
+        if probe:
+            self.probes_in_flight -= 1
+
+    def _record(self, failed, slow):
+        if self.state != CLOSED:
+            return
+        self.outcomes.append((failed, slow))
+        if len(self.outcomes) < self.min_calls:
+            return
+        failures = sum(1 for f, _ in self.outcomes if f)
+        slow_calls = sum(1 for _, s in self.outcomes if s)
+        if failures / len(self.outcomes) >= self.error_rate:
+            self._open(f"error rate {failures}/{len(self.outcomes)}")
+        elif slow_calls / len(self.outcomes) >= self.slow_call_rate:
+            self._open(f"slow-call rate {slow_calls}/{len(self.outcomes)}")
+
+    def _open(self, reason):
+        backoff = min(self.max_open_seconds, self.open_seconds * (2 ** self.consecutive_opens))
+        backoff *= random.uniform(0.5, 1.5)  # Jitter so clusters of callers don't probe in lockstep
+        self.state = OPEN
+        self.open_until = time.monotonic() + backoff
+        self.consecutive_opens += 1
+        self.opened += 1
+        logger.warning(f"{self.name} circuit opened ({reason}); failing fast for {backoff:.1f}s.")
+
+    def _close(self):
+        self.state = CLOSED
+        self.consecutive_opens = 0
+        self.outcomes.clear()
+        logger.info(f"{self.name} circuit closed.")
+
+    @property
+    def degraded(self):
+        """True while open or probing, or when errors are building up toward the threshold."""
+        if self.state != CLOSED:
+            return True
+        if len(self.outcomes) < self.min_calls:
+            return False
+        failures = sum(1 for f, _ in self.outcomes if f)
+        return failures / len(self.outcomes) >= self.error_rate / 2
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "recent_calls": len(self.outcomes),
+            "recent_failures": sum(1 for f, _ in self.outcomes if f),
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
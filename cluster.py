@@ -0,0 +1,254 @@
+# cluster.py
+"""Run SydneyBot as several worker processes, each an AutoShardedBot owning a shard range.
+
+    python cluster.py --clusters 4                # shard count from Discord's recommendation
+    python cluster.py --clusters 2 --shards 8
+    python cluster.py --simulate --clusters 3 --shards 6
+
+Discord routes a guild to shard (guild_id >> 22) % shard_count, so each cluster sees only its
+own guilds and keeps their channel histories in its own memory. DMs always arrive on shard 0.
+All clusters share the SQLite file; each process notices the others' settings changes through
+a shared version row and drops its settings caches (see database.DatabaseWorker).
+
+--simulate runs the same process layout without Discord: every worker drives its share of
+fake guilds against a local stub backend, while cluster 0 keeps rewriting a shared setting
+that the others must observe, and each worker reports how stale its view ever got.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+import time
+
+DISCORD_GATEWAY_BOT_URL = "https://discord.com/api/v10/gateway/bot"
+RESTART_BACKOFF_SECONDS = (1, 5, 15, 60)
+
+def shard_ranges(shard_count, clusters):
+    """Split shard ids 0..shard_count-1 into `clusters` contiguous, near-equal ranges."""
+    clusters = max(1, min(clusters, shard_count))
+    base, extra = divmod(shard_count, clusters)
+    ranges, start = [], 0
+    for cluster_id in range(clusters):
+        size = base + (1 if cluster_id < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+def shard_for_guild(guild_id, shard_count):
+    return (guild_id >> 22) % shard_count
+
+async def recommended_shard_count(token):
+    import aiohttp
+    async with aiohttp.ClientSession() as session:
+        async with session.get(DISCORD_GATEWAY_BOT_URL, headers={"Authorization": f"Bot {token}"}) as resp:
+            resp.raise_for_status()
+            return (await resp.json())["shards"]
+
+def _run_cluster(cluster_id, shard_ids, shard_count):
+    # config reads CLUSTER_ID at import time, so set it before importing any bot module
+    os.environ["CLUSTER_ID"] = str(cluster_id)
+    from config import DISCORD_TOKEN, logger
+    from bot import create_bot
+    logger.info(f"Cluster {cluster_id} starting with shards {shard_ids} of {shard_count}.")
+    create_bot(shard_ids=shard_ids, shard_count=shard_count).run(DISCORD_TOKEN)
+
+def supervise(targets):
+    """Start one process per (target, args) and restart any that exit, with backoff, until interrupted."""
+    context = multiprocessing.get_context("spawn")
+    processes = {}
+    restarts = {}
+    stopping = False
+
+    def start(cluster_id):
+        target, args = targets[cluster_id]
+        process = context.Process(target=target, args=args, name=f"sydney-cluster-{cluster_id}")
+        process.start()
+        processes[cluster_id] = process
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for cluster_id in range(len(targets)):
+        start(cluster_id)
+    try:
+        while not stopping:
+            time.sleep(1)
+            for cluster_id, process in list(processes.items()):
+                if process.is_alive() or stopping:
+                    continue
+                count = restarts.get(cluster_id, 0)
+                delay = RESTART_BACKOFF_SECONDS[min(count, len(RESTART_BACKOFF_SECONDS) - 1)]
+                print(f"Cluster {cluster_id} exited with code {process.exitcode}; restarting in {delay}s.", file=sys.stderr)
+                restarts[cluster_id] = count + 1
+                time.sleep(delay)
+                start(cluster_id)
+    finally:
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in processes.values():
+            process.join(30)
+
+# Simulation
+
+SHARED_USER_ID = 4242  # user_preferences row that cluster 0 keeps rewriting
+
+def _simulate_cluster(cluster_id, shard_ids, shard_count, options, workdir, results):
+    import socket
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        stub_port = sock.getsockname()[1]
+    os.environ["CLUSTER_ID"] = str(cluster_id)
+    os.environ["OPENPIPE_BASE_URL"] = f"http://127.0.0.1:{stub_port}"
+    os.chdir(workdir)  # Shared database file and logs/
+    results.put(asyncio.run(_simulate(cluster_id, shard_ids, shard_count, options, stub_port)))
+
+async def _simulate(cluster_id, shard_ids, shard_count, options, stub_port):
+    import random
+    from benchmarks.fakes import FakeBot, FakeChannel, FakeGuild, FakeMessage, Recorder
+    from benchmarks.stub_backend import StubBackend
+    from database import init_database, close_database, load_user_preference, save_user_preference
+    from cogs.sydney_cog import SydneyCog
+
+    rng = random.Random(cluster_id)
+    backend = StubBackend(latency=options["latency"], jitter=options["latency"] / 2, seed=cluster_id)
+    await backend.start(stub_port)
+    await init_database()
+
+    recorder = Recorder()
+    guilds = []
+    for index in range(options["guilds"]):
+        guild_id = ((index + 1) << 22) | index  # Deterministic, so every process agrees on ownership
+        if shard_for_guild(guild_id, shard_count) not in shard_ids:
+            continue
+        guild = FakeGuild(f"guild{index}", options["members"], seed=index)
+        guild.id = guild_id
+        guilds.append(guild)
+    channels = [FakeChannel(f"chat{c}", guild, recorder) for guild in guilds for c in range(4)]
+    bot = FakeBot(guilds)
+    bot.shard_ids, bot.shard_count = shard_ids, shard_count
+    cog = SydneyCog(bot)
+
+    # Coherence probe: cluster 0 writes the current time; everyone else records how stale their reads get
+    lags = []
+    done = asyncio.Event()
+
+    async def coherence_probe():
+        last_seen = None
+        while not done.is_set():
+            if cluster_id == 0:
+                await save_user_preference(SHARED_USER_ID, f"{time.time():.3f}")
+                await asyncio.sleep(0.5)
+            else:
+                value = await load_user_preference(SHARED_USER_ID)
+                if value and value != last_seen:
+                    if last_seen is not None:
+                        lags.append(time.time() - float(value))
+                    last_seen = value
+                await asyncio.sleep(0.05)
+
+    probe = asyncio.create_task(coherence_probe())
+    started = time.perf_counter()
+    tasks = []
+    for _ in range(options["messages"] if channels else 0):
+        channel = rng.choice(channels)
+        author = channel.guild.members[channel.id % len(channel.guild.members)]
+        mentions = [bot.user] if rng.random() < 0.2 else []
+        tasks.append(asyncio.create_task(cog.on_message(FakeMessage(author, channel, "hey sydney what's up", mentions))))
+        await asyncio.sleep(options["interval"])
+    await asyncio.gather(*tasks)
+    await asyncio.sleep(max(0.0, options["duration"] - (time.perf_counter() - started)))
+    done.set()
+    await probe
+    elapsed = time.perf_counter() - started
+
+    result = {
+        "cluster": cluster_id,
+        "shards": shard_ids,
+        "guilds": len(guilds),
+        "channels": len(cog.history),
+        "messages": len(tasks),
+        "replies": recorder.replies,
+        "seconds": elapsed,
+        "coherence_samples": len(lags),
+        "max_staleness": max(lags, default=0.0),
+    }
+    await cog.cog_unload()
+    await close_database()
+    await backend.stop()
+    return result
+
+def simulate(args, shard_count):
+    for key in ("DISCORD_TOKEN", "OPENPIPE_API_KEY", "OPENPIPE_API_KEY_EXPENSIVE"):
+        os.environ.setdefault(key, "simulated")
+    os.environ.setdefault("METRICS_PORT", "0")
+    os.environ.setdefault("REPLY_DEBOUNCE_SECONDS", "0.05")
+    workdir = tempfile.mkdtemp(prefix="sydney-cluster-sim-")
+    options = {
+        "guilds": args.guilds,
+        "members": args.members,
+        "messages": args.messages,
+        "interval": args.interval,
+        "latency": args.latency,
+        "duration": args.duration,
+    }
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=_simulate_cluster,
+            args=(cluster_id, shard_ids, shard_count, options, workdir, results),
+            name=f"sydney-sim-{cluster_id}"
+        )
+        for cluster_id, shard_ids in enumerate(shard_ranges(shard_count, args.clusters))
+    ]
+    for process in processes:
+        process.start()
+    reports = sorted((results.get() for _ in processes), key=lambda r: r["cluster"])
+    for process in processes:
+        process.join()
+
+    print(f"Simulated {len(processes)} clusters over {shard_count} shards (database and logs in {workdir}):")
+    for r in reports:
+        staleness = "writer" if r["cluster"] == 0 else f"max staleness {r['max_staleness'] * 1000:.0f} ms over {r['coherence_samples']} updates"
+        print(
+            f"  cluster {r['cluster']}: shards {r['shards']}, {r['guilds']} guilds, {r['channels']} channels with history, "
+            f"{r['messages']} messages -> {r['replies']} replies in {r['seconds']:.1f}s; {staleness}"
+        )
+    guilds = sum(r["guilds"] for r in reports)
+    if guilds != args.guilds:
+        print(f"  ownership mismatch: {guilds} guilds owned, {args.guilds} expected", file=sys.stderr)
+        return 1
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clusters", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="worker processes")
+    parser.add_argument("--shards", type=int, default=0, help="total shard count (0 = Discord's recommendation)")
+    parser.add_argument("--simulate", action="store_true", help="run fake guilds against a stub backend instead of Discord")
+    parser.add_argument("--guilds", type=int, default=24, help="[simulate] fake guilds across all shards")
+    parser.add_argument("--members", type=int, default=500, help="[simulate] members per fake guild")
+    parser.add_argument("--messages", type=int, default=200, help="[simulate] messages per cluster")
+    parser.add_argument("--interval", type=float, default=0.01, help="[simulate] seconds between messages")
+    parser.add_argument("--latency", type=float, default=0.05, help="[simulate] stub completion latency")
+    parser.add_argument("--duration", type=float, default=5.0, help="[simulate] minimum run time, for the coherence probe")
+    args = parser.parse_args()
+
+    if args.simulate:
+        shard_count = args.shards or args.clusters * 2
+        sys.exit(simulate(args, shard_count))
+
+    from config import DISCORD_TOKEN
+    shard_count = args.shards or asyncio.run(recommended_shard_count(DISCORD_TOKEN))
+    ranges = shard_ranges(shard_count, args.clusters)
+    print(f"Starting {len(ranges)} clusters over {shard_count} shards: {ranges}")
+    supervise([(_run_cluster, (cluster_id, shard_ids, shard_count)) for cluster_id, shard_ids in enumerate(ranges)])
+
+if __name__ == "__main__":
+    main()
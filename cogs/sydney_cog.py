@@ -2,66 +2,454 @@
 import discord
 from discord.ext import commands, tasks
 import time
+import os
+import threading
 import asyncio
 import random
 import re
 import datetime
-from config import logger
+from config import (
+    STREAM_REPLIES,
+    REPLY_DEBOUNCE_SECONDS,
+    REPLY_MAX_WAIT_SECONDS,
+    HEDGE_REQUESTS,
+    HEDGE_BUDGET_PER_HOUR,
+    PROMPT_TIME_BUCKET_SECONDS,
+    HISTORY_MAX_CHANNELS,
+    HISTORY_MAX_BYTES,
+    HISTORY_IDLE_SECONDS,
+    HISTORY_RETENTION_DAYS,
+    HISTORY_MAX_MESSAGE_TOKENS,
+    CONTEXT_TOKENS_SYDNEY_COURT,
+    CONTEXT_TOKENS_CSRV2,
+    REACTION_MODEL_PATH,
+    REACTION_MODEL_MIN_CONFIDENCE,
+    PROFILE_DIR,
+    PROFILE_MAX_SECONDS,
+    METRICS_HOST,
+    METRICS_PORT,
+    LOW_MEMORY_MODE,
+    logger,
+    logging_stats
+)
 from helpers import (
-    contains_trigger_word,
     is_bot_mentioned,
     random_chance,
-    replace_usernames_with_mentions,
-    replace_ping_with_mention,
-    replace_name_exclamation_with_mention,
     is_valid_prefix,
-    get_system_prompt,
     get_reaction_system_prompt,
     is_refusal
 )
 from database import (
+    close_database,
     load_user_preference,
     save_user_preference,
-    backup_database,
     load_probabilities,
-    save_probabilities
+    load_trigger_words,
+    add_trigger_word,
+    remove_trigger_word,
+    enqueue_history_append,
+    load_history,
+    prune_history,
+    cache_stats,
+    load_hedge_budget,
+    save_hedge_budget,
+    save_probabilities,
+    add_external_change_listener,
+    remove_external_change_listener
+)
+from backup import stop_backup_scheduler
+from mentions import mention_index
+from history_store import HistoryStore
+from activity import ActivityTracker
+from presence import UserCounter
+from dispatcher import ChannelDispatcher, ReplyRequest
+from prompt_builder import PromptBuilder
+from reaction_cache import reaction_cache
+from reaction_model import load_reaction_model, reaction_log
+from cache import MISSING
+from triggers import (
+    TriggerRegistry,
+    TRIGGER_NORMAL,
+    TRIGGER_EXPENSIVE,
+    MAX_TRIGGER_WORDS_PER_GUILD,
+    normalize_trigger_word
+)
+from openpipe_api import get_valid_response, get_reaction_response, stream_response, close_openpipe, openpipe_degraded, breaker_stats
+from metrics import metrics, start_metrics_server, stop_metrics_server
+from loop_monitor import loop_monitor, SamplingProfiler
+from log_pipeline import (
+    CATEGORY_MESSAGE,
+    CATEGORY_PROMPT,
+    CATEGORY_DISPATCH,
+    CATEGORY_REACTION
+)
+from streaming import stream_reply
+from hedging import get_hedged_response, hedge_budget, hedge_stats
+from scheduler import (
+    scheduler,
+    WorkDropped,
+    PRIORITY_DIRECT,
+    PRIORITY_TRIGGER,
+    PRIORITY_RANDOM,
+    PRIORITY_REACTION
 )
-from openpipe_api import get_valid_response, get_reaction_response
 
 class SydneyCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.conversation_histories = {}
         self.MAX_HISTORY_LENGTH = 50
+        self.history = HistoryStore(
+            self.MAX_HISTORY_LENGTH, HISTORY_MAX_CHANNELS, HISTORY_MAX_BYTES, HISTORY_IDLE_SECONDS,
+            persist=enqueue_history_append, load=load_history, max_message_tokens=HISTORY_MAX_MESSAGE_TOKENS
+        )
         self.start_time = time.time()
-        self.recent_messages = {}  # To track recent messages and their authors
+        # Distinct users for the presence status, seeded once and then maintained from member events.
+        # Without a member cache there is nothing to count, so low-memory mode uses guild member counts.
+        self.users = UserCounter()
+        if not LOW_MEMORY_MODE:
+            for guild in self.bot.guilds:
+                self.users.add_guild(guild)
+        self.activity = ActivityTracker(window=5)  # Recent speakers per channel, for the collision check
         self.temperature = 0.1777  # Default temperature
         self.trigger_words = [
             "sydney", "syd", "s!talk", "sydneybot#3817"
         ]
         self.expensive_trigger_words = ["xxx"]
-        self.probabilities = {}  # Store reply and reaction probabilities per guild/channel
+        self.triggers = TriggerRegistry(self.trigger_words, self.expensive_trigger_words)
+        # Another cluster process may have changed stored trigger words; rebuild matchers lazily
+        self._loop = asyncio.get_running_loop()
+        add_external_change_listener(self._on_external_db_change)
+        loop_monitor.start(self._loop)
+        self._profiling = False
+        self.prompts = PromptBuilder(PROMPT_TIME_BUCKET_SECONDS)
+        self.reaction_model = load_reaction_model(REACTION_MODEL_PATH)  # None without NumPy or a trained model
+        self.dispatcher = ChannelDispatcher(self._reply, REPLY_DEBOUNCE_SECONDS, REPLY_MAX_WAIT_SECONDS)
         self.update_presence.start()
-
-    def cog_unload(self):
+        self.evict_idle_histories.start()
+        self.prune_persisted_histories.start()
+        self.report_cache_stats.start()
+        self.sweep_activity.start()
+        self.flush_reaction_log.start()
+        metrics.add_collector(self._collect_metrics)
+
+    async def cog_load(self):
+        await start_metrics_server(METRICS_HOST, METRICS_PORT)
+
+    def _on_external_db_change(self):
+        # Called on the database thread
+        self._loop.call_soon_threadsafe(self.triggers.clear)
+
+    async def cog_unload(self):
+        remove_external_change_listener(self._on_external_db_change)
+        metrics.remove_collector(self._collect_metrics)
+        loop_monitor.stop()
+        await stop_metrics_server()
+        self.dispatcher.close()
         self.update_presence.cancel()
+        self.evict_idle_histories.cancel()
+        self.prune_persisted_histories.cancel()
+        self.report_cache_stats.cancel()
+        self.sweep_activity.cancel()
+        self.flush_reaction_log.cancel()
+        await asyncio.to_thread(reaction_log.flush)
+        await asyncio.to_thread(stop_backup_scheduler)
+        await close_openpipe()
+        await close_database()
+
+    def _collect_metrics(self):
+        """Gauges read at scrape time from the components that already keep their own stats."""
+        for name, s in dict(cache_stats(), reactions=reaction_cache.stats()).items():
+            yield 'cache_hits', {'cache': name}, s['hits']
+            yield 'cache_misses', {'cache': name}, s['misses']
+            yield 'cache_entries', {'cache': name}, s['size']
+        sched = scheduler.stats()
+        yield 'scheduler_running', {}, sched['running']
+        for priority, depth in sched['depth'].items():
+            yield 'scheduler_queue_depth', {'priority': priority}, depth
+        for priority, waits in sched['wait_seconds'].items():
+            yield 'scheduler_wait_p95_seconds', {'priority': priority}, round(waits['p95'], 6)
+        for reason, count in sched['dropped'].items():
+            yield 'scheduler_dropped', {'reason': reason}, count
+        for model, s in breaker_stats().items():
+            yield 'circuit_open', {'model': model}, 0 if s['state'] == 'closed' else 1
+            yield 'circuit_rejected', {'model': model}, s['rejected']
+        for name, value in self.dispatcher.stats().items():
+            yield f'dispatcher_{name}', {}, value
+        for name, value in hedge_stats.items():
+            yield f'hedge_{name}', {}, value
+        yield 'loop_stall_worst_seconds', {}, round(loop_monitor.worst, 6)
+        log_stats = logging_stats()
+        for category, count in log_stats['sampled_out'].items():
+            yield 'log_records_sampled_out', {'category': category}, count
+        yield 'log_records_queue_full', {}, log_stats['queue_full']
+        memory = self.history.memory_usage()
+        yield 'history_channels', {}, memory['channels']
+        yield 'history_bytes', {}, memory['bytes']
+        yield 'prompt_last_bytes', {}, self.prompts.last_bytes
+        yield 'prompt_last_tokens', {}, self.prompts.last_tokens
+        yield 'prompt_records_left_out', {}, self.prompts.records_left_out
+        yield 'activity_channels', {}, len(self.activity)
+        yield 'guilds', {}, len(self.bot.guilds)
+        yield 'users', {}, self._user_count()
+
+    def _user_count(self):
+        if LOW_MEMORY_MODE:
+            # Not deduplicated across guilds, but needs no member cache
+            return sum(guild.member_count or 0 for guild in self.bot.guilds)
+        return len(self.users)
 
     @tasks.loop(minutes=5)
     async def update_presence(self):
+        # Pick first, then build only the chosen status; every count is O(1)
         statuses = [
-            discord.Activity(type=discord.ActivityType.watching, name=f"{len(self.bot.guilds)} servers"),
-            discord.Activity(type=discord.ActivityType.listening, name=f"{len(set(self.bot.get_all_members()))} users"),
-            discord.Activity(type=discord.ActivityType.watching, name=f"{sum(len(channels) for channels in self.conversation_histories.values())} active chats"),
-            discord.Activity(type=discord.ActivityType.playing, name="with AI conversations"),
-            discord.Activity(type=discord.ActivityType.watching, name=f"Uptime: {str(datetime.timedelta(seconds=int(time.time() - self.start_time)))}"),
-            discord.Activity(type=discord.ActivityType.listening, name="s!sydney_help"),
+            lambda: discord.Activity(type=discord.ActivityType.watching, name=f"{len(self.bot.guilds)} servers"),
+            lambda: discord.Activity(type=discord.ActivityType.listening, name=f"{self._user_count()} users"),
+            lambda: discord.Activity(type=discord.ActivityType.watching, name=f"{len(self.history)} active chats"),
+            lambda: discord.Activity(type=discord.ActivityType.playing, name="with AI conversations"),
+            lambda: discord.Activity(type=discord.ActivityType.watching, name=f"Uptime: {str(datetime.timedelta(seconds=int(time.time() - self.start_time)))}"),
+            lambda: discord.Activity(type=discord.ActivityType.listening, name="s!sydney_help"),
         ]
-        status = random.choice(statuses)
+        status = random.choice(statuses)()
         try:
             await self.bot.change_presence(activity=status)
         except Exception as e:
             logger.error(f"Error updating presence: {e}")
 
+    @tasks.loop(minutes=5)
+    async def evict_idle_histories(self):
+        self.history.evict_idle()
+        usage = self.history.memory_usage()
+        logger.debug(f"History store: {usage['channels']} channels, {usage['records']} messages, ~{usage['bytes'] // 1024} KiB.")
+
+    @tasks.loop(hours=6)
+    async def prune_persisted_histories(self):
+        try:
+            removed = await prune_history(HISTORY_RETENTION_DAYS * 86400)
+            if removed:
+                logger.info(f"Pruned {removed} persisted history messages older than {HISTORY_RETENTION_DAYS} days.")
+        except Exception as e:
+            logger.error(f"Error pruning persisted histories: {e}")
+
+    @tasks.loop(seconds=30)
+    async def sweep_activity(self):
+        # Drop channels that went quiet; busy channels are expired as they are written to
+        self.activity.sweep()
+
+    @tasks.loop(minutes=1)
+    async def flush_reaction_log(self):
+        try:
+            await asyncio.to_thread(reaction_log.flush)
+        except OSError as e:
+            logger.error(f"Failed to write the reaction log: {e}")
+
+    @tasks.loop(minutes=15)
+    async def report_cache_stats(self):
+        stats = dict(cache_stats(), reactions=reaction_cache.stats())
+        logger.info("Cache hit rates: " + ", ".join(
+            f"{name} {s['hit_rate']:.1%} ({s['hits']}/{s['hits'] + s['misses']}, {s['size']} entries)"
+            for name, s in stats.items()
+        ))
+        prompt_stats = self.prompts.stats()
+        logger.info(
+            f"Prompt sizes: last {prompt_stats['last_bytes']} B, avg {prompt_stats['avg_bytes']} B, "
+            f"max {prompt_stats['max_bytes']} B over {prompt_stats['builds']} builds; "
+            f"~{prompt_stats['avg_tokens']} tokens avg, ~{prompt_stats['max_tokens']} max, "
+            f"{prompt_stats['records_left_out']} history messages left out by the budget."
+        )
+        sched = scheduler.stats()
+        waits = ", ".join(
+            f"{name} avg {w['avg']:.2f}s p95 {w['p95']:.2f}s" for name, w in sched['wait_seconds'].items()
+        )
+        logger.info(
+            f"Scheduler: {sched['running']} running, {sched['waiting']} waiting {sched['depth']}, "
+            f"waits [{waits}], dropped {sched['dropped']}."
+        )
+        logger.info("Circuit breakers: " + ", ".join(
+            f"{model} {s['state']} ({s['recent_failures']}/{s['recent_calls']} recent failures, "
+            f"opened {s['opened']}x, rejected {s['rejected']})"
+            for model, s in breaker_stats().items()
+        ))
+        log_stats = logging_stats()
+        if log_stats['sampled_out'] or log_stats['queue_full']:
+            logger.info(f"Log records sampled out: {log_stats['sampled_out']}, dropped on full queue: {log_stats['queue_full']}.")
+
+    # Keep the per-guild name index in step with membership instead of rescanning guild.members
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        mention_index.add_member(member)
+        if not LOW_MEMORY_MODE:
+            self.users.add(member.id)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before, after):
+        if before.display_name != after.display_name or before.name != after.name:
+            mention_index.add_member(after)
+
+    @commands.Cog.listener()
+    async def on_user_update(self, before, after):
+        if before.name != after.name or before.display_name != after.display_name:
+            for guild in after.mutual_guilds:
+                member = guild.get_member(after.id)
+                if member is not None:
+                    mention_index.add_member(member)
+
+    @commands.Cog.listener()
+    async def on_raw_member_remove(self, payload):
+        mention_index.remove_member(payload.guild_id, payload.user.id)
+        if not LOW_MEMORY_MODE:
+            self.users.remove(payload.user.id)
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild):
+        if not LOW_MEMORY_MODE:
+            self.users.add_guild(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        mention_index.drop_guild(guild.id)
+        self.users.remove_guild(guild)
+
+    def _render_response(self, response, message_prefix, message, is_dm):
+        """Turn a raw completion into the text posted on Discord."""
+        # Extract custom name if present
+        custom_name_match = re.match(r"^(.+?):\s*(.*)$", response)
+        response_content = custom_name_match.group(2) if custom_name_match else response
+
+        # Prepend message prefix if any
+        if message_prefix:
+            response_content = f"{message_prefix} {response_content}"
+
+        # Replace placeholders and usernames with mentions
+        if not is_dm:
+            with metrics.stage('mention_rewrite'):
+                response_content = mention_index.rewrite(response_content, message.guild, message.author)
+
+        # Truncate response if it exceeds Discord's limit
+        if len(response_content) > 2000:
+            response_content = response_content[:1997] + '...'
+        return response_content
+
+    async def _lookup_mentions(self, text, message):
+        """Low-memory mode: fetch members named in text that the mention index doesn't know yet."""
+        if message.guild is None:
+            return False
+        with metrics.stage('mention_lookup'):
+            return await mention_index.lookup(text, message.guild)
+
+    async def _stream_response(self, message, messages, tags, render, use_expensive_model, on_first_post=None):
+        """Stream a reply into Discord, escalating to the expensive model if the stream refuses."""
+        result = await stream_reply(
+            message,
+            stream_response(messages, tags, temperature=self.temperature, use_expensive_model=use_expensive_model),
+            render,
+            on_first_post=on_first_post
+        )
+        if result.usable:
+            if result.sent is not None and await self._lookup_mentions(result.content, message):
+                rewritten = mention_index.rewrite(result.content, message.guild, message.author)
+                if len(rewritten) > 2000:
+                    rewritten = rewritten[:1997] + '...'
+                if rewritten != result.content:
+                    await result.sent.edit(content=rewritten)
+                    return rewritten
+            return result.content
+
+        # Refused, empty or broken stream: fall back to the non-streaming path, which also escalates on refusal
+        if result.refused and not use_expensive_model:
+            logger.info("Switching to the expensive model due to refusal.")
+        response = await get_valid_response(
+            messages, tags,
+            initial_temperature=self.temperature,
+            use_expensive_model=use_expensive_model or result.refused
+        )
+        await self._lookup_mentions(response, message)
+        response_content = render(response)
+        if on_first_post is not None:
+            on_first_post()
+        if result.sent is not None:
+            await result.sent.edit(content=response_content)
+        else:
+            await message.reply(response_content, mention_author=False)
+        return response_content
+
+    async def _reply(self, request):
+        """Generate and post one reply for a (possibly coalesced) burst of triggers."""
+        message = request.message
+        guild_id = request.guild_id
+        channel_id = request.channel_id
+        is_dm = request.is_dm
+        use_expensive_model = request.use_expensive_model
+
+        tags = {
+            "user_id": str(message.author.id),
+            "channel_id": str(channel_id),
+            "server_id": str(guild_id) if guild_id != "DM" else "DM",
+            "interaction_type": "trigger_chat",
+            "prompt_id": "sydney_v1.0"
+        }
+
+        def commit():
+            # From here on the reply is visible, so a newer burst must not cancel it
+            request.committed = True
+
+        try:
+            # Waits for a scheduler slot by priority; rate-limited or shed work raises WorkDropped
+            async with scheduler.slot(request.priority, message.author.id, channel_id, guild_id), message.channel.typing():
+                # System prompt plus as much recent history as the token budget allows, reusing the
+                # cached prompt and message dicts. Built once the slot is ours, so messages that
+                # arrived while queued are included. Built for the larger budget of the models this
+                # reply may use; each client trims it to its own budget.
+                with metrics.stage('history_load'):
+                    await self.history.ensure_loaded(guild_id, channel_id)
+                budget = CONTEXT_TOKENS_CSRV2 if use_expensive_model else max(CONTEXT_TOKENS_SYDNEY_COURT, CONTEXT_TOKENS_CSRV2)
+                send_budget = CONTEXT_TOKENS_CSRV2 if use_expensive_model else CONTEXT_TOKENS_SYDNEY_COURT
+                with metrics.stage('prompt_build'):
+                    messages = self.prompts.build(
+                        message.author.display_name, guild_id, channel_id, self.history.records(guild_id, channel_id), budget, send_budget
+                    )
+                logger.debug(
+                    "Built prompt of %d messages; sending %d bytes, ~%d tokens.", len(messages), self.prompts.last_bytes, self.prompts.last_tokens,
+                    extra=CATEGORY_PROMPT
+                )
+
+                # Get user preferences
+                with metrics.stage('load_user_preference'):
+                    message_prefix = await load_user_preference(message.author.id)
+
+                def render(response):
+                    return self._render_response(response, message_prefix, message, is_dm)
+
+                if STREAM_REPLIES:
+                    with metrics.stage('stream_reply'):
+                        response_content = await self._stream_response(message, messages, tags, render, use_expensive_model, commit)
+                else:
+                    with metrics.stage('completion'):
+                        if HEDGE_REQUESTS and not use_expensive_model:
+                            hedge_limit = None if is_dm else await load_hedge_budget(guild_id)
+                            response = await get_hedged_response(messages, tags, guild_id, hedge_limit=hedge_limit, initial_temperature=self.temperature)
+                        else:
+                            response = await get_valid_response(messages, tags, initial_temperature=self.temperature, use_expensive_model=use_expensive_model)
+                    await self._lookup_mentions(response, message)
+                    response_content = render(response)
+
+                    # Use Discord's reply feature
+                    commit()
+                    with metrics.stage('discord_send'):
+                        await message.reply(response_content, mention_author=False)
+                metrics.inc('replies_total')
+                metrics.observe('reply_seconds', time.monotonic() - request.created)
+
+                # Update conversation history with assistant's response
+                self.history.append(guild_id, channel_id, "assistant", response_content, author_id=self.bot.user.id)
+                if request.coalesced > 1:
+                    logger.debug("Answered %d triggers in channel %s with one reply.", request.coalesced, channel_id, extra=CATEGORY_DISPATCH)
+
+        except WorkDropped as e:
+            logger.debug("Dropped reply in channel %s: %s", channel_id, e.reason, extra=CATEGORY_DISPATCH)
+        except Exception as e:
+            await message.reply("Sorry, I encountered an error while processing your request.")
+            logger.error(f"Error processing message from {message.author}: {e}")
+
     @commands.Cog.listener()
     async def on_message(self, message):
         if message.author == self.bot.user:
@@ -74,21 +462,17 @@ class SydneyCog(commands.Cog):
         if message.content.startswith(self.bot.command_prefix):
             return
 
-        logger.debug(f"Received message: {message.content}")
+        logger.debug("Received message in %s: %.200s", message.channel.id, message.content, extra=CATEGORY_MESSAGE)
 
         is_dm = isinstance(message.channel, discord.DMChannel)
         guild_id = "DM" if is_dm else str(message.guild.id)
         channel_id = message.channel.id
 
-        # Load probabilities for the guild and channel
-        reply_probability, reaction_probability = load_probabilities(guild_id, channel_id)
-
-        # Initialize conversation history for guild and channel if not present
-        if guild_id not in self.conversation_histories:
-            self.conversation_histories[guild_id] = {}
+        metrics.inc('messages_total')
 
-        if channel_id not in self.conversation_histories[guild_id]:
-            self.conversation_histories[guild_id][channel_id] = []
+        # Load probabilities for the guild and channel
+        with metrics.stage('load_probabilities'):
+            reply_probability, reaction_probability = await load_probabilities(guild_id, channel_id)
 
         role = "assistant" if message.author == self.bot.user else "user"
         content = message.clean_content
@@ -103,137 +487,118 @@ class SydneyCog(commands.Cog):
             if match:
                 prefix = match.group(1).strip()
                 if is_valid_prefix(prefix):
-                    save_user_preference(message.author.id, prefix)
+                    await save_user_preference(message.author.id, prefix)
                     await message.channel.send(f"Okay, I'll start my messages with '{prefix}' from now on.")
                 else:
                     await message.channel.send("Sorry, that prefix is invalid or too long.")
 
-        self.conversation_histories[guild_id][channel_id].append({
-            "role": role,
-            "content": content,
-            "timestamp": time.time()
-        })
+        with metrics.stage('history_append'):
+            self.history.append(guild_id, channel_id, role, content, author_id=message.author.id)
 
-        if len(self.conversation_histories[guild_id][channel_id]) > self.MAX_HISTORY_LENGTH:
-            self.conversation_histories[guild_id][channel_id] = self.conversation_histories[guild_id][channel_id][-self.MAX_HISTORY_LENGTH:]
+        # Track recent speakers
+        self.activity.record(channel_id, message.author.id)
 
-        # Track recent messages asynchronously
-        if channel_id not in self.recent_messages:
-            self.recent_messages[channel_id] = []
-        self.recent_messages[channel_id].append((message.author.id, time.time()))
-
-        # Clean up old messages
-        self.recent_messages[channel_id] = [
-            (author_id, timestamp) for author_id, timestamp in self.recent_messages[channel_id]
-            if time.time() - timestamp < 5
-        ]
+        if LOW_MEMORY_MODE and not is_dm:
+            # No member cache: mention candidates are the people actually talking here
+            mention_index.remember(message.author)
+            for member in message.mentions:
+                if isinstance(member, discord.Member):
+                    mention_index.remember(member)
 
         # Check if another bot has replied recently
-        if any(author_id != message.author.id and author_id != self.bot.user.id for author_id, _ in self.recent_messages[channel_id]):
+        if self.activity.other_author_active(channel_id, message.author.id):
             return
 
         should_respond = False
         use_expensive_model = False
+        priority = PRIORITY_RANDOM
 
-        if is_bot_mentioned(message, self.bot.user):
+        mentioned = is_bot_mentioned(message, self.bot.user)
+        # One pass over the content classifies normal vs expensive triggers
+        with metrics.stage('trigger_match'):
+            trigger = None if mentioned else await self.triggers.classify(guild_id, message.content)
+
+        if mentioned:
             should_respond = True
-        elif contains_trigger_word(message.content, self.trigger_words):
+            priority = PRIORITY_DIRECT
+        elif trigger == TRIGGER_NORMAL:
             should_respond = True
-        elif contains_trigger_word(message.content, self.expensive_trigger_words):
+            priority = PRIORITY_TRIGGER
+        elif trigger == TRIGGER_EXPENSIVE:
             should_respond = True
             use_expensive_model = True
+            priority = PRIORITY_TRIGGER
         elif is_dm:
             should_respond = True
+            priority = PRIORITY_DIRECT
+        elif openpipe_degraded():
+            pass  # Shed optional replies while OpenPipe is struggling; direct triggers still go through
         elif random_chance(reply_probability):
             should_respond = True
 
         if should_respond:
-            # Build the system prompt without summary
-            system_prompt = get_system_prompt(message.author.display_name, guild_id, channel_id)
-            messages = [{"role": "system", "content": system_prompt}]
-            # Include the last 50 messages as context
-            messages.extend(self.conversation_histories[guild_id][channel_id])
-
-            tags = {
-                "user_id": str(message.author.id),
-                "channel_id": str(channel_id),
-                "server_id": str(guild_id) if guild_id != "DM" else "DM",
-                "interaction_type": "trigger_chat",
-                "prompt_id": "sydney_v1.0"
-            }
-
-            try:
-                async with message.channel.typing():
-                    response = await get_valid_response(messages, tags, initial_temperature=self.temperature, use_expensive_model=use_expensive_model)
-
-                    # Extract custom name if present
-                    custom_name_match = re.match(r"^(.+?):\s*(.*)$", response)
-                    custom_name = custom_name_match.group(1) if custom_name_match else None
-                    response_content = custom_name_match.group(2) if custom_name_match else response
-
-                    # Get user preferences
-                    message_prefix = load_user_preference(message.author.id)
-
-                    # Prepend message prefix if any
-                    if message_prefix:
-                        response_content = f"{message_prefix} {response_content}"
-
-                    # Replace placeholders and usernames with mentions
-                    if not is_dm:
-                        response_content = replace_usernames_with_mentions(response_content, message.guild)
-                        response_content = replace_ping_with_mention(response_content, message.author)
-                        response_content = replace_name_exclamation_with_mention(response_content, message.author)
-
-                    # Truncate response if it exceeds Discord's limit
-                    if len(response_content) > 2000:
-                        response_content = response_content[:1997] + '...'
-
-                    # Use Discord's reply feature
-                    await message.reply(response_content, mention_author=False)
-
-                    # Update conversation history with assistant's response
-                    self.conversation_histories[guild_id][channel_id].append({
-                        "role": "assistant",
-                        "content": response_content,
-                        "timestamp": time.time()
-                    })
-
-                    if len(self.conversation_histories[guild_id][channel_id]) > self.MAX_HISTORY_LENGTH:
-                        self.conversation_histories[guild_id][channel_id] = self.conversation_histories[guild_id][channel_id][-self.MAX_HISTORY_LENGTH:]
-
-                    # Backup the database after changes
-                    backup_database()
-
-            except Exception as e:
-                await message.reply("Sorry, I encountered an error while processing your request.")
-                logger.error(f"Error processing message from {message.author}: {e}")
+            # Replies are debounced and coalesced per channel; the dispatcher calls _reply
+            self.dispatcher.submit(ReplyRequest(
+                message, guild_id, channel_id, is_dm,
+                direct=mentioned or trigger is not None or is_dm,
+                use_expensive_model=use_expensive_model,
+                priority=priority
+            ))
 
         # Reaction handling
         if role == "user":
             if random_chance(reaction_probability):
+                user_message = message.clean_content
+                reaction = reaction_cache.get(user_message)
+                from_api = False
                 try:
-                    # Show typing indicator
-                    async with message.channel.typing():
-                        # Prepare the system prompt and user message
-                        system_prompt = get_reaction_system_prompt()
-                        user_message = message.clean_content
-
-                        # Build the messages for the API call
-                        messages = [
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": user_message}
-                        ]
-
-                        # Make the API call to get the reaction
-                        reaction = await get_reaction_response(messages)
+                    if reaction is MISSING and self.reaction_model is not None:
+                        # Microseconds locally; only unsure predictions go on to the API
+                        emoji, confidence = self.reaction_model.predict(user_message)
+                        if confidence >= REACTION_MODEL_MIN_CONFIDENCE:
+                            reaction = emoji
+                            metrics.inc('reaction_model_total', outcome='confident')
+                        else:
+                            metrics.inc('reaction_model_total', outcome='low_confidence')
+                    if reaction is MISSING and openpipe_degraded():
+                        logger.debug("Skipping uncached reaction while OpenPipe is degraded.", extra=CATEGORY_REACTION)
+                        reaction = None
+                    elif reaction is MISSING:
+                        # Reactions are the lowest-priority work and the first to be shed
+                        async with scheduler.slot(PRIORITY_REACTION, message.author.id, channel_id, guild_id), message.channel.typing():
+                            # Prepare the system prompt
+                            system_prompt = get_reaction_system_prompt()
+
+                            # Build the messages for the API call
+                            messages = [
+                                {"role": "system", "content": system_prompt},
+                                {"role": "user", "content": user_message}
+                            ]
+
+                            # Make the API call to get the reaction
+                            with metrics.stage('reaction_completion'):
+                                reaction = await get_reaction_response(messages, raise_errors=True)
+                        from_api = True
+                        # Remember negative results too, so repeated chatter never re-asks the API
+                        reaction_cache.put(user_message, reaction)
 
                     # Add the reaction to the message
                     if reaction:
-                        await message.add_reaction(reaction.strip())
+                        with metrics.stage('discord_react'):
+                            await message.add_reaction(reaction.strip())
+                        metrics.inc('reactions_total')
+                        if from_api:
+                            # Only reactions Discord accepted become training data for the local model
+                            reaction_log.record(user_message, reaction.strip())
                     else:
-                        logger.debug("No suitable reaction found.")
+                        logger.debug("No suitable reaction found.", extra=CATEGORY_REACTION)
+                except WorkDropped as e:
+                    logger.debug("Dropped reaction in channel %s: %s", channel_id, e.reason, extra=CATEGORY_REACTION)
                 except discord.HTTPException as e:
                     logger.error(f"Failed to add reaction: {e}")
+                    if e.status == 400:
+                        # Discord rejected the emoji; don't serve it from the cache again
+                        reaction_cache.put(user_message, None)
                 except Exception as e:
                     logger.error(f"Error adding reaction to message from {message.author}: {e}")
 
@@ -256,7 +621,15 @@ class SydneyCog(commands.Cog):
                 "**s!set_reaction_probability <value>**\n"
                 "Sets the reaction probability (0-1). Determines how often Sydney reacts to messages with emojis.\n\n"
                 "**s!set_reply_probability <value>**\n"
-                "Sets the reply probability (0-1). Determines how often Sydney randomly replies to messages.\n"
+                "Sets the reply probability (0-1). Determines how often Sydney randomly replies to messages.\n\n"
+                "**s!add_trigger_word <word>** / **s!add_expensive_trigger_word <word>**\n"
+                "Adds a word that makes Sydney reply in this server (Manage Server required).\n\n"
+                "**s!remove_trigger_word <word>**\n"
+                "Removes one of this server's trigger words.\n\n"
+                "**s!list_trigger_words**\n"
+                "Lists this server's trigger words.\n\n"
+                "**s!set_hedge_budget [value]**\n"
+                "Caps speculative expensive-model requests per hour (Manage Server required).\n"
             ),
             inline=False
         )
@@ -288,6 +661,163 @@ class SydneyCog(commands.Cog):
         logger.exception(f"Error in sydney_help command: {error}")
         await ctx.send("An error occurred while displaying the help message.")
 
+    async def _add_trigger_word(self, ctx, word, expensive):
+        normalized = normalize_trigger_word(word)
+        if normalized is None:
+            await ctx.send("Sorry, that trigger word is empty or too long.")
+            return
+        guild_id = str(ctx.guild.id)
+        existing = {w for w, _ in await load_trigger_words(guild_id)}
+        if normalized not in existing and len(existing) >= MAX_TRIGGER_WORDS_PER_GUILD:
+            await ctx.send(f"This server already has the maximum of {MAX_TRIGGER_WORDS_PER_GUILD} trigger words.")
+            return
+        await add_trigger_word(guild_id, normalized, expensive=expensive)
+        self.triggers.invalidate(guild_id)
+        kind = "expensive trigger word" if expensive else "trigger word"
+        await ctx.send(f"Added '{normalized}' as a {kind} for this server.")
+
+    @commands.command(name='add_trigger_word')
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def add_trigger_word_command(self, ctx, *, word: str):
+        """Adds a server trigger word that makes Sydney reply."""
+        await self._add_trigger_word(ctx, word, expensive=False)
+
+    @commands.command(name='add_expensive_trigger_word')
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def add_expensive_trigger_word_command(self, ctx, *, word: str):
+        """Adds a server trigger word that makes Sydney reply with the expensive model."""
+        await self._add_trigger_word(ctx, word, expensive=True)
+
+    @commands.command(name='remove_trigger_word')
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def remove_trigger_word_command(self, ctx, *, word: str):
+        """Removes a server trigger word."""
+        normalized = normalize_trigger_word(word) or ''
+        guild_id = str(ctx.guild.id)
+        if await remove_trigger_word(guild_id, normalized):
+            self.triggers.invalidate(guild_id)
+            await ctx.send(f"Removed trigger word '{normalized}'.")
+        else:
+            await ctx.send(f"'{normalized}' is not a trigger word in this server.")
+
+    @commands.command(name='list_trigger_words')
+    @commands.guild_only()
+    async def list_trigger_words_command(self, ctx):
+        """Lists the server's custom trigger words."""
+        words = sorted(await load_trigger_words(str(ctx.guild.id)))
+        if not words:
+            await ctx.send("This server has no custom trigger words.")
+            return
+        listing = ", ".join(f"{word} (expensive)" if expensive else word for word, expensive in words)
+        if len(listing) > 1900:
+            listing = listing[:1897] + '...'
+        await ctx.send(f"Trigger words for this server: {listing}")
+
+    @commands.command(name='set_hedge_budget')
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def set_hedge_budget(self, ctx, budget: int = None):
+        """Sets how many speculative CSRv2 requests per hour this server may use (omit to reset)."""
+        if budget is not None and budget < 0:
+            await ctx.send("The hedge budget must be 0 or more.")
+            return
+        guild_id = str(ctx.guild.id)
+        await save_hedge_budget(guild_id, budget)
+        effective = HEDGE_BUDGET_PER_HOUR if budget is None else budget
+        await ctx.send(
+            f"Hedge budget set to {effective} speculative requests per hour "
+            f"({hedge_budget.used(guild_id)} used in the last hour)."
+        )
+
+    @commands.command(name='sydney_stats')
+    @commands.is_owner()
+    async def sydney_stats(self, ctx):
+        """Shows per-stage latencies and API counters (bot owner only)."""
+        embed = discord.Embed(title="SydneyBot Stats", color=discord.Color.blue())
+        stages = metrics.stage_summary()
+        if stages:
+            rows = [f"{'stage':<20} {'n':>7} {'p50':>8} {'p95':>8} {'p99':>8}"]
+            for stage, (count, p50, p95, p99) in stages.items():
+                rows.append(f"{stage:<20} {count:>7} {p50 * 1000:>6.1f}ms {p95 * 1000:>6.1f}ms {p99 * 1000:>6.1f}ms")
+            embed.add_field(name="Stage latency", value="```\n" + "\n".join(rows)[:1000] + "\n```", inline=False)
+        embed.add_field(
+            name="Throughput",
+            value=(
+                f"Messages: {metrics.counter('messages_total')}\n"
+                f"Replies: {metrics.counter('replies_total')}\n"
+                f"Reactions: {metrics.counter('reactions_total')}\n"
+                f"API calls: {metrics.counter('openpipe_calls_total')} "
+                f"({metrics.counter('openpipe_calls_total', outcome='error')} errors)\n"
+                f"Retries: {metrics.counter('retries_total')}\n"
+                f"Refusals: {metrics.counter('refusals_total')}\n"
+                f"Escalations: {metrics.counter('model_escalations_total')}"
+            ),
+            inline=True
+        )
+        sched = scheduler.stats()
+        circuits = ", ".join(f"{model.split(':')[-1]} {s['state']}" for model, s in breaker_stats().items())
+        loop = loop_monitor.stats()
+        embed.add_field(
+            name="Load",
+            value=(
+                f"Running: {sched['running']}, waiting: {sched['waiting']}\n"
+                f"Dropped: {sum(sched['dropped'].values())}\n"
+                f"Circuits: {circuits}\n"
+                f"Loop stalls: {loop['stalls']} (worst {loop['worst_seconds']:.2f}s)\n"
+                f"Active chats: {len(self.history)}"
+            ),
+            inline=True
+        )
+        embed.set_footer(text=f"Prometheus metrics: http://{METRICS_HOST}:{METRICS_PORT}/metrics" if METRICS_PORT else "Metrics endpoint disabled")
+        await ctx.send(embed=embed)
+
+    @commands.command(name='sydney_stalls')
+    @commands.is_owner()
+    async def sydney_stalls(self, ctx, count: int = 5):
+        """Shows the most recent event-loop stalls and where they happened (bot owner only)."""
+        if not loop_monitor.threshold:
+            await ctx.send("The loop monitor is disabled (LOOP_STALL_SECONDS=0).")
+            return
+        stalls = list(loop_monitor.stalls)[-max(1, min(count, 10)):]
+        if not stalls:
+            await ctx.send(f"No event-loop stalls over {loop_monitor.threshold}s recorded.")
+            return
+        blocks = []
+        for stall in reversed(stalls):
+            when = datetime.datetime.fromtimestamp(stall.started).strftime('%H:%M:%S')
+            stack = stall.top_stacks(1)[0][0] if stall.stacks else ()
+            blocks.append(f"{when} {stall.summary()}\n" + "\n".join(f"  {frame}" for frame in stack[-6:]))
+        await ctx.send("```\n" + "\n\n".join(blocks)[:1900] + "\n```")
+
+    @commands.command(name='sydney_profile')
+    @commands.is_owner()
+    async def sydney_profile(self, ctx, seconds: int = 30):
+        """Samples the event loop for a while and uploads the profile (bot owner only)."""
+        if self._profiling:
+            await ctx.send("A profile is already running.")
+            return
+        seconds = max(1, min(seconds, PROFILE_MAX_SECONDS))
+        self._profiling = True
+        try:
+            await ctx.send(f"Profiling the event loop for {seconds}s...")
+            # Sampled from a worker thread, so the loop being profiled keeps running normally
+            profiler = SamplingProfiler(threading.get_ident())
+            await asyncio.to_thread(profiler.run, seconds)
+            path = os.path.join(PROFILE_DIR, f"profile-{datetime.datetime.now():%Y%m%d-%H%M%S}.txt")
+            await asyncio.to_thread(profiler.dump, path, seconds)
+        finally:
+            self._profiling = False
+        logger.info(f"Wrote a {seconds}s event-loop profile to {path}.")
+        hottest = "\n".join(f"{own:5d} {total:6d}  {function}" for function, own, total in profiler.hottest(10))
+        summary = f"Profile written to `{path}` ({profiler.samples} samples).\n```\n own  total  function\n{hottest}"[:1900] + "\n```"
+        if os.path.getsize(path) < 8 * 1024 * 1024:
+            await ctx.send(summary, file=discord.File(path))
+        else:
+            await ctx.send(summary)
+
     # Add other commands like set_temperature, set_reply_probability, set_reaction_probability, etc.
 
     # Error handlers
@@ -299,6 +829,12 @@ class SydneyCog(commands.Cog):
             await ctx.send("Missing required argument. Please check the command usage.")
         elif isinstance(error, commands.BadArgument):
             await ctx.send("Invalid argument type. Please check the command usage.")
+        elif isinstance(error, commands.MissingPermissions):
+            await ctx.send("You don't have permission to use this command.")
+        elif isinstance(error, commands.NotOwner):
+            await ctx.send("Only the bot owner can use this command.")
+        elif isinstance(error, commands.NoPrivateMessage):
+            await ctx.send("This command can only be used in a server.")
         elif isinstance(error, commands.CommandOnCooldown):
             await ctx.send(f"Command is on cooldown. Try again after {round(error.retry_after, 2)} seconds.")
         else:
@@ -1,8 +1,11 @@
 # config.py
 import os
 from dotenv import load_dotenv
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+from logging.handlers import RotatingFileHandler, QueueListener
+from log_pipeline import CategorySampler, DroppingQueueHandler, JsonFormatter, parse_category_map
 
 # Load environment variables
 load_dotenv()
@@ -18,22 +21,131 @@ if not OPENPIPE_API_KEY:
 if not OPENPIPE_API_KEY_EXPENSIVE:
     raise EnvironmentError("Missing OPENPIPE_API_KEY_EXPENSIVE in environment variables.")
 
+# OpenPipe client
+OPENPIPE_BASE_URL = os.getenv('OPENPIPE_BASE_URL', 'https://api.openpipe.ai/api/v1')
+OPENPIPE_TIMEOUT_SECONDS = float(os.getenv('OPENPIPE_TIMEOUT_SECONDS', '60'))
+OPENPIPE_MAX_CONNECTIONS = int(os.getenv('OPENPIPE_MAX_CONNECTIONS', '32'))  # Pooled keep-alive connections
+OPENPIPE_MAX_CONCURRENCY = int(os.getenv('OPENPIPE_MAX_CONCURRENCY', '16'))  # In-flight Sydney-Court requests
+OPENPIPE_MAX_CONCURRENCY_EXPENSIVE = int(os.getenv('OPENPIPE_MAX_CONCURRENCY_EXPENSIVE', '4'))  # In-flight CSRv2 requests
+
+# OpenPipe circuit breakers (one per model)
+BREAKER_WINDOW = int(os.getenv('BREAKER_WINDOW', '50'))  # Recent calls considered
+BREAKER_MIN_CALLS = int(os.getenv('BREAKER_MIN_CALLS', '10'))  # Calls needed before the breaker can trip
+BREAKER_ERROR_RATE = float(os.getenv('BREAKER_ERROR_RATE', '0.5'))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv('BREAKER_SLOW_CALL_SECONDS', '30'))
+BREAKER_SLOW_CALL_RATE = float(os.getenv('BREAKER_SLOW_CALL_RATE', '0.8'))
+BREAKER_OPEN_SECONDS = float(os.getenv('BREAKER_OPEN_SECONDS', '5'))  # First backoff; doubles (with jitter) on each re-open
+BREAKER_MAX_OPEN_SECONDS = float(os.getenv('BREAKER_MAX_OPEN_SECONDS', '300'))
+
+# Cluster mode (set by cluster.py for each worker process; unset when running bot.py directly)
+CLUSTER_ID = int(os.environ['CLUSTER_ID']) if os.getenv('CLUSTER_ID') else None
+DB_COHERENCE_SECONDS = float(os.getenv('DB_COHERENCE_SECONDS', '1'))  # How often to look for other processes' commits; 0 disables
+
+# Metrics endpoint (Prometheus text format, served on loopback only by default)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))  # 0 disables the endpoint
+if METRICS_PORT and CLUSTER_ID is not None:
+    METRICS_PORT += CLUSTER_ID  # One endpoint per cluster process
+
+# Event-loop diagnostics
+LOOP_STALL_SECONDS = float(os.getenv('LOOP_STALL_SECONDS', '0.25'))  # Report loop stalls longer than this; 0 disables the monitor
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')  # Where s!sydney_profile writes its output
+PROFILE_MAX_SECONDS = int(os.getenv('PROFILE_MAX_SECONDS', '120'))
+
+# Work scheduling and rate limits
+SCHEDULER_CONCURRENCY = int(os.getenv('SCHEDULER_CONCURRENCY', '8'))  # Generation jobs running at once
+SCHEDULER_MAX_QUEUE = int(os.getenv('SCHEDULER_MAX_QUEUE', '100'))  # Waiting jobs before the lowest priority is evicted
+SCHEDULER_SHED_DEPTH = int(os.getenv('SCHEDULER_SHED_DEPTH', '20'))  # Queue depth at which random replies and reactions are dropped
+# Token buckets as (tokens per minute, burst)
+RATE_LIMIT_USER = (float(os.getenv('RATE_LIMIT_USER_PER_MINUTE', '6')), int(os.getenv('RATE_LIMIT_USER_BURST', '4')))
+RATE_LIMIT_CHANNEL = (float(os.getenv('RATE_LIMIT_CHANNEL_PER_MINUTE', '12')), int(os.getenv('RATE_LIMIT_CHANNEL_BURST', '6')))
+RATE_LIMIT_GUILD = (float(os.getenv('RATE_LIMIT_GUILD_PER_MINUTE', '40')), int(os.getenv('RATE_LIMIT_GUILD_BURST', '15')))
+
+# Reply dispatch
+REPLY_DEBOUNCE_SECONDS = float(os.getenv('REPLY_DEBOUNCE_SECONDS', '1.5'))  # Triggers this close together share one reply
+REPLY_MAX_WAIT_SECONDS = float(os.getenv('REPLY_MAX_WAIT_SECONDS', '4'))  # ...but a burst is answered at most this long after it began
+
+# Prompt assembly
+PROMPT_TIME_BUCKET_SECONDS = int(os.getenv('PROMPT_TIME_BUCKET_SECONDS', '900'))  # Timestamp granularity in the system prompt
+# Estimated prompt tokens (system prompt plus history) sent to each model; older history is left out to fit
+CONTEXT_TOKENS_SYDNEY_COURT = int(os.getenv('CONTEXT_TOKENS_SYDNEY_COURT', '4000'))
+CONTEXT_TOKENS_CSRV2 = int(os.getenv('CONTEXT_TOKENS_CSRV2', '6000'))
+
+# Local reaction model (see reaction_model.py; retrain with `python reaction_model.py train`)
+REACTION_MODEL_PATH = os.getenv('REACTION_MODEL_PATH', 'reaction_model.npz')
+REACTION_MODEL_MIN_CONFIDENCE = float(os.getenv('REACTION_MODEL_MIN_CONFIDENCE', '0.6'))  # Below this, ask the API
+# Reactions picked by the API, as training data; one file per cluster process
+REACTION_LOG_PATH = os.getenv('REACTION_LOG_PATH') or ('logs/reactions.jsonl' if CLUSTER_ID is None else f'logs/reactions.cluster{CLUSTER_ID}.jsonl')
+
+# Hedged requests (speculative CSRv2 call when Sydney-Court is slow or refusing)
+HEDGE_REQUESTS = os.getenv('HEDGE_REQUESTS', 'false').lower() == 'true'
+HEDGE_LATENCY_PERCENTILE = float(os.getenv('HEDGE_LATENCY_PERCENTILE', '0.9'))  # Hedge once the primary is slower than this
+HEDGE_MIN_DELAY_SECONDS = float(os.getenv('HEDGE_MIN_DELAY_SECONDS', '2'))
+HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv('HEDGE_DEFAULT_DELAY_SECONDS', '8'))  # Used until enough latencies are observed
+HEDGE_BUDGET_PER_HOUR = int(os.getenv('HEDGE_BUDGET_PER_HOUR', '30'))  # Default per-guild cap on hedged CSRv2 calls
+
+# Streaming replies
+STREAM_REPLIES = os.getenv('STREAM_REPLIES', 'false').lower() == 'true'
+STREAM_FIRST_POST_CHARS = int(os.getenv('STREAM_FIRST_POST_CHARS', '80'))  # Characters buffered before the first post
+STREAM_EDIT_INTERVAL_SECONDS = float(os.getenv('STREAM_EDIT_INTERVAL_SECONDS', '1.2'))  # Discord allows ~5 edits per 5s per channel
+
+# Low-memory mode: no member cache or startup chunking; mentions resolve from recently seen members
+LOW_MEMORY_MODE = os.getenv('LOW_MEMORY_MODE', 'false').lower() == 'true'
+MEMBER_LRU_SIZE = int(os.getenv('MEMBER_LRU_SIZE', '50000'))  # Members kept for mention rewriting in low-memory mode
+MENTION_LOOKUPS_PER_REPLY = int(os.getenv('MENTION_LOOKUPS_PER_REPLY', '3'))  # Gateway member queries for unknown '@names' per reply
+
+# Conversation history store
+HISTORY_MAX_CHANNELS = int(os.getenv('HISTORY_MAX_CHANNELS', '5000'))  # Channels kept in memory
+HISTORY_MAX_BYTES = int(os.getenv('HISTORY_MAX_BYTES', str(64 * 1024 * 1024)))  # Approximate memory budget
+HISTORY_IDLE_SECONDS = int(os.getenv('HISTORY_IDLE_SECONDS', str(6 * 3600)))  # Evict channels idle this long
+HISTORY_RETENTION_DAYS = int(os.getenv('HISTORY_RETENTION_DAYS', '30'))  # Persisted history older than this is pruned
+HISTORY_MAX_MESSAGE_TOKENS = int(os.getenv('HISTORY_MAX_MESSAGE_TOKENS', '1000'))  # Longer messages are cut; 0 keeps them whole
+
+# Database backups
+BACKUP_DIR = os.getenv('BACKUP_DIR', 'backups')
+BACKUP_INTERVAL_SECONDS = int(os.getenv('BACKUP_INTERVAL_SECONDS', '3600'))  # Back up at least this often when dirty
+BACKUP_DIRTY_WRITES = int(os.getenv('BACKUP_DIRTY_WRITES', '500'))  # ...or as soon as this many settings writes accumulate (history appends don't count)
+BACKUP_KEEP = int(os.getenv('BACKUP_KEEP', '5'))  # Number of rotated snapshots to keep
+
 # Set up logging
 if not os.path.exists('logs'):
     os.makedirs('logs')
 
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG').upper()
+LOG_JSON = os.getenv('LOG_JSON', 'false').lower() == 'true'  # One JSON object per line in the log file
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))  # Records beyond this are dropped rather than blocking
+# Hot-path debug categories (see log_pipeline.CATEGORY_*): fraction kept, then max records per second
+LOG_SAMPLE_RATES = parse_category_map(os.getenv('LOG_SAMPLE_RATES', 'message:0.1,mentions:0.25'))
+LOG_RATE_LIMITS = parse_category_map(os.getenv('LOG_RATE_LIMITS', 'message:20,mentions:20,prompt:20,dispatch:20,reaction:20,db:20'))
+
 logger = logging.getLogger('sydney_bot')
-logger.setLevel(logging.DEBUG)  # Set to DEBUG for detailed logs
+logger.setLevel(LOG_LEVEL)
 
 # File Handler with Rotation
-file_handler = RotatingFileHandler('logs/sydney_bot.log', maxBytes=5*1024*1024, backupCount=5, encoding='utf-8')
-file_formatter = logging.Formatter('%(asctime)s %(levelname)s %(name)s - %(message)s')
+# Cluster processes each rotate their own file; a shared file would be rotated from under the others
+log_file = 'logs/sydney_bot.log' if CLUSTER_ID is None else f'logs/sydney_bot.cluster{CLUSTER_ID}.log'
+file_handler = RotatingFileHandler(log_file, maxBytes=5*1024*1024, backupCount=5, encoding='utf-8')
+if LOG_JSON:
+    file_formatter = JsonFormatter({} if CLUSTER_ID is None else {"cluster": CLUSTER_ID})
+else:
+    file_formatter = logging.Formatter('%(asctime)s %(levelname)s %(name)s - %(message)s')
 file_handler.setFormatter(file_formatter)
-logger.addHandler(file_handler)
 
 # Console Handler
 console_handler = logging.StreamHandler()
 console_handler.setLevel(logging.INFO)
-console_formatter = logging.Formatter('%(levelname)s - %(message)s')
+console_formatter = logging.Formatter('%(levelname)s - %(message)s' if CLUSTER_ID is None else f'[cluster {CLUSTER_ID}] %(levelname)s - %(message)s')
 console_handler.setFormatter(console_formatter)
-logger.addHandler(console_handler)
\ No newline at end of file
+
+# Callers only enqueue; formatting for output, file writes and rotation happen on the listener thread
+log_sampler = CategorySampler(LOG_SAMPLE_RATES, LOG_RATE_LIMITS)
+queue_handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+queue_handler.addFilter(log_sampler)
+logger.addHandler(queue_handler)
+log_listener = QueueListener(queue_handler.queue, file_handler, console_handler, respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop)  # Flush what is still queued on exit
+
+def logging_stats():
+    """Records dropped by sampling/rate limits (per category) and by a full queue."""
+    return {"sampled_out": dict(log_sampler.dropped), "queue_full": queue_handler.dropped}
@@ -1,96 +1,578 @@
 # database.py
+import asyncio
+import queue
 import sqlite3
 import threading
-import shutil
-import os
-from config import logger
+import time
+from cache import LRUCache, MISSING
+from config import DB_COHERENCE_SECONDS, logger
+from log_pipeline import CATEGORY_DB
+from metrics import metrics
 
-db_lock = threading.Lock()
 DATABASE_FILE = 'user_preferences.db'
+WRITE_BATCH_SIZE = 100  # Max queued writes committed in one transaction
+WORKER_START_TIMEOUT = 10  # Seconds to wait for the worker to open the database
 
-def init_database():
-    with db_lock:
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
-        # Create user preferences table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_preferences (
-                user_id INTEGER PRIMARY KEY,
-                message_prefix TEXT
-            )
-        ''')
-        # Create probabilities table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS probabilities (
-                guild_id TEXT,
-                channel_id TEXT,
-                reply_probability REAL DEFAULT 0.1,
-                reaction_probability REAL DEFAULT 0.2,
-                PRIMARY KEY (guild_id, channel_id)
-            )
-        ''')
-        conn.commit()
-        conn.close()
-        logger.info("Database initialized.")
+DEFAULT_REPLY_PROBABILITY = 0.1
+DEFAULT_REACTION_PROBABILITY = 0.2
+
+# Write-through caches in front of the settings tables. Entries are refreshed by the
+# save functions; the TTL only bounds staleness if the file is edited externally.
+probabilities_cache = LRUCache(maxsize=4096, ttl=3600)
+user_preferences_cache = LRUCache(maxsize=8192, ttl=3600)
+guild_settings_cache = LRUCache(maxsize=4096, ttl=3600)
+
+class _Job:
+    __slots__ = ('fn', 'write', 'future', 'loop', 'dirty')
+
+    def __init__(self, fn, write, future, loop, dirty=True):
+        self.fn = fn
+        self.write = write
+        self.future = future
+        self.loop = loop
+        self.dirty = dirty  # A settings change: bumps the settings version and is counted by write listeners
+
+    def resolve(self, result=None, error=None):
+        def _set():
+            if self.future.done():
+                return
+            if error is not None:
+                self.future.set_exception(error)
+            else:
+                self.future.set_result(result)
+        try:
+            self.loop.call_soon_threadsafe(_set)
+        except RuntimeError:
+            # The event loop is already closed; nobody is waiting for the result.
+            pass
+
+_write_listeners = []
+_external_change_listeners = []
+
+def add_write_listener(callback):
+    """Register callback(count), called on the database thread after each committed write batch.
+
+    Writes queued with dirty=False (history) are not counted. Settings changes by other
+    processes sharing the file are reported as a single write once noticed.
+    """
+    _write_listeners.append(callback)
+
+def remove_write_listener(callback):
+    if callback in _write_listeners:
+        _write_listeners.remove(callback)
+
+def add_external_change_listener(callback):
+    """Register callback(), called on the database thread when another process has changed settings.
+
+    The settings caches are already cleared by then; use this for caches kept elsewhere.
+    """
+    _external_change_listeners.append(callback)
+
+def remove_external_change_listener(callback):
+    if callback in _external_change_listeners:
+        _external_change_listeners.remove(callback)
+
+def _notify(listeners, *args):
+    for listener in listeners:
+        try:
+            listener(*args)
+        except Exception as e:
+            logger.error(f"Database listener failed: {e}", exc_info=True)
+
+class DatabaseWorker(threading.Thread):
+    """Owns the single long-lived SQLite connection and runs every query on its own thread.
+
+    Reads run one at a time in submission order. Consecutive writes are drained from the
+    queue and committed together in one transaction, each inside its own savepoint so a
+    failing write does not roll back its neighbours.
+
+    Every batch with a dirty (settings) write also bumps the one-row settings_version table in
+    the same transaction. When several processes share the file (cluster mode), that version is
+    polled every coherence_interval seconds, and a change made by another process drops the
+    settings caches so no process keeps serving stale values. History writes leave the version
+    alone, so they never cost another process its caches.
+
+    If the connection can't be opened, `ready` is still set and the error is kept in
+    startup_error. Whenever the thread exits, every job it has not answered is failed, so
+    no caller waits forever.
+    """
+
+    def __init__(self, path, coherence_interval=DB_COHERENCE_SECONDS):
+        super().__init__(name='sydney-db', daemon=True)
+        self.path = path
+        self.jobs = queue.Queue()
+        self.conn = None
+        self.ready = threading.Event()
+        self.coherence_interval = coherence_interval
+        self.settings_version = None  # Last value of settings_version this process saw or wrote
+        self.last_coherence_check = 0.0
+        self.external_changes = 0
+        self.startup_error = None
+        self.accepting = True
+        self._accept_lock = threading.Lock()
+        self._pending = []  # A job pulled off the queue while draining a write batch, possibly the stop request
+        self._in_flight = []  # The read or write batch being run
+
+    def run(self):
+        try:
+            # isolation_level=None: autocommit for reads, explicit BEGIN/COMMIT for write batches
+            self.conn = sqlite3.connect(self.path, isolation_level=None)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.execute('PRAGMA busy_timeout=5000')
+            self.settings_version = self._read_settings_version()
+            self.last_coherence_check = time.monotonic()
+        except Exception as e:
+            self.startup_error = e
+            logger.error(f"Could not open the database {self.path}: {e}", exc_info=True)
+            self._fail_unanswered(e)
+            return
+        finally:
+            self.ready.set()
+        error = None
+        try:
+            self._serve()
+        except BaseException as e:
+            error = RuntimeError(f"The database worker crashed: {e!r}")
+            logger.error(f"Database worker crashed: {e!r}", exc_info=True)
+        finally:
+            self._fail_unanswered(error or RuntimeError("The database worker has stopped."))
+            self.conn.close()
+            logger.info("Database connection closed.")
+
+    def _fail_unanswered(self, error):
+        with self._accept_lock:
+            self.accepting = False
+        jobs = self._pending + self._in_flight
+        self._pending, self._in_flight = [], []
+        while True:
+            try:
+                jobs.append(self.jobs.get_nowait())
+            except queue.Empty:
+                break
+        for job in jobs:
+            if job is not None:
+                job.resolve(error=error)  # No-op for jobs already answered
+
+    def _serve(self):
+        pending = self._pending
+        while True:
+            if self.coherence_interval:
+                self._check_external_changes()
+            if pending:
+                job = pending.pop()
+            elif self.coherence_interval:
+                try:
+                    job = self.jobs.get(timeout=self.coherence_interval)
+                except queue.Empty:
+                    continue
+            else:
+                job = self.jobs.get()
+            if job is None:
+                break
+            if not job.write:
+                self._in_flight = [job]
+                self._run_read(job)
+                continue
+            batch = [job]
+            while len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    nxt = self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None or not nxt.write:
+                    pending.append(nxt)
+                    break
+                batch.append(nxt)
+            self._in_flight = batch
+            self._run_writes(batch)
+
+    def _read_settings_version(self):
+        """The shared settings version, or None before init_database has created it."""
+        try:
+            row = self.conn.execute('SELECT version FROM settings_version').fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return row[0] if row else None
+
+    def _check_external_changes(self):
+        now = time.monotonic()
+        if now - self.last_coherence_check < self.coherence_interval:
+            return
+        self.last_coherence_check = now
+        try:
+            version = self._read_settings_version()
+        except sqlite3.Error as e:
+            logger.error(f"Could not read the settings version: {e}")
+            return
+        if version is None or version == self.settings_version:
+            return
+        known, self.settings_version = self.settings_version, version
+        if known is not None:
+            self._external_change()
+
+    def _bump_settings_version(self):
+        """Bump the settings version inside the current write transaction.
+
+        Returns True if another process had bumped it since this one last looked.
+        """
+        version = self._read_settings_version()
+        if version is None:
+            return False
+        self.conn.execute('UPDATE settings_version SET version = ?', (version + 1,))
+        external = self.settings_version is not None and version != self.settings_version
+        self.settings_version = version + 1
+        return external
+
+    def _external_change(self):
+        self.external_changes += 1
+        for cache in (probabilities_cache, user_preferences_cache, guild_settings_cache):
+            cache.clear()
+        logger.debug("Another process changed settings; cleared settings caches.")
+        _notify(_external_change_listeners)
+        _notify(_write_listeners, 1)
+
+    def _run_read(self, job):
+        try:
+            with metrics.time('db_seconds', kind='read'):
+                result = job.fn(self.conn)
+            job.resolve(result=result)
+        except Exception as e:
+            job.resolve(error=e)
+
+    def _run_writes(self, batch):
+        results = []
+        started = time.perf_counter()
+        try:
+            self.conn.execute('BEGIN IMMEDIATE')
+            for job in batch:
+                self.conn.execute('SAVEPOINT job')
+                try:
+                    results.append((job, job.fn(self.conn), None))
+                    self.conn.execute('RELEASE job')
+                except Exception as e:
+                    self.conn.execute('ROLLBACK TO job')
+                    self.conn.execute('RELEASE job')
+                    results.append((job, None, e))
+            committed = sum(1 for job, _, error in results if error is None and job.dirty)
+            external = committed and self._bump_settings_version()
+            self.conn.execute('COMMIT')
+        except Exception as e:
+            logger.error(f"Database write batch of {len(batch)} failed: {e}", exc_info=True)
+            if self.conn.in_transaction:
+                self.conn.execute('ROLLBACK')
+            for job in batch:
+                job.resolve(error=e)
+            return
+        metrics.observe('db_seconds', time.perf_counter() - started, kind='write_batch')
+        metrics.inc('db_writes_total', len(batch))
+        if len(batch) > 1:
+            logger.debug("Committed %d database writes in one transaction.", len(batch), extra=CATEGORY_DB)
+        if external:
+            self._external_change()
+        if committed:
+            _notify(_write_listeners, committed)
+        for job, result, error in results:
+            job.resolve(result=result, error=error)
+
+    def submit(self, fn, write, dirty=True):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._accept_lock:
+            if not self.accepting:
+                raise RuntimeError("The database worker has stopped.")
+            self.jobs.put(_Job(fn, write, future, loop, dirty))
+        return future
 
-def load_user_preference(user_id):
+    def stop(self):
+        self.jobs.put(None)
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def _get_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive() or not _worker.accepting:
+            _worker = DatabaseWorker(DATABASE_FILE)
+            _worker.start()
+            if not _worker.ready.wait(WORKER_START_TIMEOUT):
+                raise RuntimeError(f"The database worker did not open {DATABASE_FILE} within {WORKER_START_TIMEOUT}s.")
+            if _worker.startup_error is not None:
+                worker, _worker = _worker, None
+                raise worker.startup_error
+        return _worker
+
+async def run_read(fn):
+    """Run fn(conn) on the database thread and return its result."""
+    return await _get_worker().submit(fn, write=False)
+
+async def run_write(fn, dirty=True):
+    """Run fn(conn) on the database thread as part of a batched write transaction.
+
+    dirty=False marks a write that changes no settings (history), see enqueue_write.
+    """
+    return await _get_worker().submit(fn, write=True, dirty=dirty)
+
+def _log_write_error(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Queued database write failed: {future.exception()}")
+
+def enqueue_write(fn, dirty=True):
+    """Queue fn(conn) as a write without waiting for it.
+
+    The job is queued before this returns, so any read submitted afterwards sees it.
+    Failures are logged. dirty=False keeps the write out of the write listeners' counts and
+    leaves the settings version alone, so other processes keep their caches.
+    """
+    future = _get_worker().submit(fn, write=True, dirty=dirty)
+    future.add_done_callback(_log_write_error)
+    return future
+
+async def close_database():
+    """Flush queued work and close the persistent connection."""
+    global _worker
+    with _worker_lock:
+        worker, _worker = _worker, None
+    if worker is not None and worker.is_alive():
+        worker.stop()
+        await asyncio.to_thread(worker.join)
+
+def _create_tables(conn):
+    # Create user preferences table
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_preferences (
+            user_id INTEGER PRIMARY KEY,
+            message_prefix TEXT
+        )
+    ''')
+    # Create probabilities table
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS probabilities (
+            guild_id TEXT,
+            channel_id TEXT,
+            reply_probability REAL DEFAULT 0.1,
+            reaction_probability REAL DEFAULT 0.2,
+            PRIMARY KEY (guild_id, channel_id)
+        )
+    ''')
+    # Create conversation history table; only the newest rows per channel are kept
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS conversation_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id TEXT,
+            channel_id TEXT,
+            role TEXT,
+            content TEXT,
+            timestamp REAL,
+            author_id INTEGER
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_conversation_history_channel
+        ON conversation_history (guild_id, channel_id, id)
+    ''')
+    # Create per-guild settings table; NULL columns fall back to the configured defaults
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS guild_settings (
+            guild_id TEXT PRIMARY KEY,
+            hedge_budget_per_hour INTEGER
+        )
+    ''')
+    # Create per-guild trigger words table
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS trigger_words (
+            guild_id TEXT,
+            word TEXT,
+            expensive INTEGER DEFAULT 0,
+            PRIMARY KEY (guild_id, word)
+        )
+    ''')
+    # Single row bumped by every settings write; other processes poll it to drop stale caches
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS settings_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('INSERT OR IGNORE INTO settings_version (id, version) VALUES (1, 0)')
+
+async def init_database():
+    await run_write(_create_tables, dirty=False)  # Every process runs it; it changes no settings
+    logger.info("Database initialized.")
+
+async def load_user_preference(user_id):
     """Load user preferences."""
-    with db_lock:
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
-        cursor.execute('SELECT message_prefix FROM user_preferences WHERE user_id = ?', (user_id,))
-        result = cursor.fetchone()
-        conn.close()
-        return result[0] if result else None
-
-def save_user_preference(user_id, message_prefix):
+    cached = user_preferences_cache.get(user_id)
+    if cached is not MISSING:
+        return cached
+    def _load(conn):
+        result = conn.execute('SELECT message_prefix FROM user_preferences WHERE user_id = ?', (user_id,)).fetchone()
+        prefix = result[0] if result else None
+        # Filled on the worker thread so the cache follows database order; None is cached too
+        user_preferences_cache.set(user_id, prefix)
+        return prefix
+    return await run_read(_load)
+
+async def save_user_preference(user_id, message_prefix):
     """Save user preferences."""
-    with db_lock:
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
-        cursor.execute('REPLACE INTO user_preferences (user_id, message_prefix) VALUES (?, ?)', (user_id, message_prefix))
-        conn.commit()
-        conn.close()
-
-def backup_database():
-    """Create a backup of the database file."""
-    with db_lock:
-        backup_file = f"{DATABASE_FILE}.bak"
-        shutil.copy(DATABASE_FILE, backup_file)
-    logger.info("Database backup created.")
-
-def load_probabilities(guild_id, channel_id):
+    def _save(conn):
+        conn.execute('REPLACE INTO user_preferences (user_id, message_prefix) VALUES (?, ?)', (user_id, message_prefix))
+    try:
+        await run_write(_save)
+    except Exception:
+        user_preferences_cache.invalidate(user_id)
+        raise
+    user_preferences_cache.set(user_id, message_prefix)
+
+def _select_probabilities(conn, guild_id, channel_id):
+    result = conn.execute('''
+        SELECT reply_probability, reaction_probability
+        FROM probabilities
+        WHERE guild_id = ? AND channel_id = ?
+    ''', (guild_id, channel_id)).fetchone()
+    if result:
+        return tuple(result)
+    return DEFAULT_REPLY_PROBABILITY, DEFAULT_REACTION_PROBABILITY
+
+async def load_probabilities(guild_id, channel_id):
     """Load reply and reaction probabilities."""
-    with db_lock:
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT reply_probability, reaction_probability 
-            FROM probabilities 
-            WHERE guild_id = ? AND channel_id = ?
-        ''', (guild_id, str(channel_id)))
-        result = cursor.fetchone()
-        conn.close()
-        if result:
-            reply_probability, reaction_probability = result
-        else:
-            reply_probability, reaction_probability = 0.1, 0.2  # Default values
-        return reply_probability, reaction_probability
-
-def save_probabilities(guild_id, channel_id, reply_probability=None, reaction_probability=None):
-    """Save reply and reaction probabilities."""
-    current_reply_prob, current_reaction_prob = load_probabilities(guild_id, channel_id)
-    reply_probability = reply_probability if reply_probability is not None else current_reply_prob
-    reaction_probability = reaction_probability if reaction_probability is not None else current_reaction_prob
-    with db_lock:
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
-        cursor.execute('''
+    key = (guild_id, str(channel_id))
+    cached = probabilities_cache.get(key)
+    if cached is not MISSING:
+        return cached
+    def _load(conn):
+        probabilities = _select_probabilities(conn, *key)
+        probabilities_cache.set(key, probabilities)
+        return probabilities
+    return await run_read(_load)
+
+async def save_probabilities(guild_id, channel_id, reply_probability=None, reaction_probability=None):
+    """Save reply and reaction probabilities.
+
+    A single upsert: columns passed as None keep their stored value, or the default for a new row.
+    """
+    key = (guild_id, str(channel_id))
+    def _save(conn):
+        conn.execute('''
             INSERT INTO probabilities (guild_id, channel_id, reply_probability, reaction_probability)
-            VALUES (?, ?, ?, ?)
+            VALUES (:guild_id, :channel_id, COALESCE(:reply, :default_reply), COALESCE(:reaction, :default_reaction))
             ON CONFLICT(guild_id, channel_id) DO UPDATE SET
-                reply_probability = excluded.reply_probability,
-                reaction_probability = excluded.reaction_probability
-        ''', (guild_id, str(channel_id), reply_probability, reaction_probability))
-        conn.commit()
-        conn.close()
\ No newline at end of file
+                reply_probability = COALESCE(:reply, reply_probability),
+                reaction_probability = COALESCE(:reaction, reaction_probability)
+        ''', {
+            'guild_id': guild_id,
+            'channel_id': key[1],
+            'reply': reply_probability,
+            'reaction': reaction_probability,
+            'default_reply': DEFAULT_REPLY_PROBABILITY,
+            'default_reaction': DEFAULT_REACTION_PROBABILITY,
+        })
+        # Same transaction, so the cached row is exactly what was committed
+        return _select_probabilities(conn, *key)
+    try:
+        probabilities = await run_write(_save)
+    except Exception:
+        probabilities_cache.invalidate(key)
+        raise
+    probabilities_cache.set(key, probabilities)
+    return probabilities
+
+async def load_trigger_words(guild_id):
+    """Load a guild's custom trigger words as (word, expensive) pairs."""
+    def _load(conn):
+        rows = conn.execute('SELECT word, expensive FROM trigger_words WHERE guild_id = ?', (str(guild_id),)).fetchall()
+        return [(word, bool(expensive)) for word, expensive in rows]
+    return await run_read(_load)
+
+async def add_trigger_word(guild_id, word, expensive=False):
+    """Add or update a guild trigger word. Returns the guild's word count afterwards."""
+    def _add(conn):
+        conn.execute(
+            'REPLACE INTO trigger_words (guild_id, word, expensive) VALUES (?, ?, ?)',
+            (str(guild_id), word, int(expensive))
+        )
+        return conn.execute('SELECT COUNT(*) FROM trigger_words WHERE guild_id = ?', (str(guild_id),)).fetchone()[0]
+    return await run_write(_add)
+
+async def remove_trigger_word(guild_id, word):
+    """Remove a guild trigger word. Returns True if it existed."""
+    def _remove(conn):
+        cursor = conn.execute('DELETE FROM trigger_words WHERE guild_id = ? AND word = ?', (str(guild_id), word))
+        return cursor.rowcount > 0
+    return await run_write(_remove)
+
+async def load_hedge_budget(guild_id):
+    """Load a guild's hourly cap on speculative CSRv2 requests, or None for the default."""
+    key = str(guild_id)
+    cached = guild_settings_cache.get(key)
+    if cached is not MISSING:
+        return cached
+    def _load(conn):
+        result = conn.execute('SELECT hedge_budget_per_hour FROM guild_settings WHERE guild_id = ?', (key,)).fetchone()
+        budget = result[0] if result else None
+        guild_settings_cache.set(key, budget)
+        return budget
+    return await run_read(_load)
+
+async def save_hedge_budget(guild_id, budget):
+    """Save a guild's hourly hedge cap; None restores the default."""
+    key = str(guild_id)
+    def _save(conn):
+        conn.execute('''
+            INSERT INTO guild_settings (guild_id, hedge_budget_per_hour) VALUES (?, ?)
+            ON CONFLICT(guild_id) DO UPDATE SET hedge_budget_per_hour = excluded.hedge_budget_per_hour
+        ''', (key, budget))
+    try:
+        await run_write(_save)
+    except Exception:
+        guild_settings_cache.invalidate(key)
+        raise
+    guild_settings_cache.set(key, budget)
+
+def enqueue_history_append(guild_id, channel_id, record, keep):
+    """Persist one history record and trim the channel to its newest `keep` rows."""
+    channel_id = str(channel_id)
+    def _append(conn):
+        conn.execute('''
+            INSERT INTO conversation_history (guild_id, channel_id, role, content, timestamp, author_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (guild_id, channel_id, record.role, record.content, record.timestamp, record.author_id))
+        conn.execute('''
+            DELETE FROM conversation_history
+            WHERE guild_id = ? AND channel_id = ? AND id <= (
+                SELECT id FROM conversation_history
+                WHERE guild_id = ? AND channel_id = ?
+                ORDER BY id DESC LIMIT 1 OFFSET ?
+            )
+        ''', (guild_id, channel_id, guild_id, channel_id, keep))
+    # One of these per message; counting them would trigger a full backup every few hundred messages
+    return enqueue_write(_append, dirty=False)
+
+async def load_history(guild_id, channel_id, limit):
+    """Load a channel's newest history rows, oldest first, as (role, content, timestamp, author_id)."""
+    def _load(conn):
+        rows = conn.execute('''
+            SELECT role, content, timestamp, author_id FROM conversation_history
+            WHERE guild_id = ? AND channel_id = ?
+            ORDER BY id DESC LIMIT ?
+        ''', (guild_id, str(channel_id), limit)).fetchall()
+        rows.reverse()
+        return rows
+    return await run_read(_load)
+
+async def prune_history(max_age_seconds):
+    """Delete history rows older than max_age_seconds. Returns the number removed."""
+    def _prune(conn):
+        return conn.execute(
+            'DELETE FROM conversation_history WHERE timestamp < ?', (time.time() - max_age_seconds,)
+        ).rowcount
+    return await run_write(_prune, dirty=False)
+
+def cache_stats():
+    """Hit/miss counters for the settings caches."""
+    return {
+        "probabilities": probabilities_cache.stats(),
+        "user_preferences": user_preferences_cache.stats(),
+        "guild_settings": guild_settings_cache.stats(),
+    }
@@ -0,0 +1,131 @@
+# dispatcher.py
+import asyncio
+import time
+from config import logger
+from log_pipeline import CATEGORY_DISPATCH
+
+class ReplyRequest:
+    """A decision to reply in a channel, triggered by one message."""
+
+    __slots__ = ('message', 'guild_id', 'channel_id', 'is_dm', 'direct', 'use_expensive_model', 'priority', 'created', 'committed', 'coalesced')
+
+    def __init__(self, message, guild_id, channel_id, is_dm, direct, use_expensive_model, priority):
+        self.message = message
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.is_dm = is_dm
+        self.direct = direct  # Mention, trigger word or DM, as opposed to a random reply
+        self.use_expensive_model = use_expensive_model
+        self.priority = priority  # scheduler.PRIORITY_*
+        self.created = time.monotonic()
+        self.committed = False  # Set by the handler once it starts posting to Discord
+        self.coalesced = 1  # Number of triggers this request answers
+
+    def merge(self, newer):
+        """Fold a newer trigger into this pending request and return the request to keep."""
+        # Thread the reply to the newest directly addressed message; a random reply never steals it
+        target = newer if newer.direct or not self.direct else self
+        target.use_expensive_model = self.use_expensive_model or newer.use_expensive_model
+        target.direct = self.direct or newer.direct
+        target.priority = min(self.priority, newer.priority)
+        target.coalesced = self.coalesced + newer.coalesced
+        target.created = min(self.created, newer.created)
+        return target
+
+class _ChannelState:
+    __slots__ = ('pending', 'pending_since', 'timer', 'inflight', 'inflight_request')
+
+    def __init__(self):
+        self.pending = None
+        self.pending_since = 0.0  # When the oldest trigger in `pending` arrived
+        self.timer = None
+        self.inflight = None
+        self.inflight_request = None
+
+class ChannelDispatcher:
+    """Debounces reply triggers per channel and answers each burst with one completion.
+
+    A trigger in a quiet channel (nothing pending or in flight) is answered immediately. Later
+    triggers arriving within debounce_seconds of each other are merged into one request, which
+    fires at most max_wait_seconds after its first trigger even if the channel never goes
+    quiet. When a burst fires while an older completion is still running and has not posted
+    anything yet, the older one is cancelled and merged into the new request, which covers it.
+    """
+
+    def __init__(self, handler, debounce_seconds, max_wait_seconds=None):
+        self.handler = handler  # async handler(request)
+        self.debounce_seconds = debounce_seconds
+        self.max_wait_seconds = max_wait_seconds if max_wait_seconds is not None else debounce_seconds * 3
+        self.channels = {}  # (guild_id, channel_id) -> _ChannelState
+        self.coalesced = 0
+        self.cancelled = 0
+
+    def submit(self, request):
+        key = (request.guild_id, request.channel_id)
+        state = self.channels.get(key)
+        if state is None:
+            state = self.channels[key] = _ChannelState()
+        if state.pending is None and (state.inflight is None or state.inflight.done()):
+            # Nothing to coalesce with, so there is nothing to wait for
+            state.pending = request
+            self._fire(key, state)
+            return
+        now = time.monotonic()
+        if state.pending is not None:
+            self.coalesced += 1
+            request = state.pending.merge(request)
+        else:
+            state.pending_since = now
+        state.pending = request
+        if state.timer is not None:
+            state.timer.cancel()
+        # Debounce, but never hold the oldest trigger past max_wait_seconds
+        delay = min(self.debounce_seconds, state.pending_since + self.max_wait_seconds - now)
+        state.timer = asyncio.create_task(self._fire_after(key, state, max(0.0, delay)))
+
+    async def _fire_after(self, key, state, delay):
+        await asyncio.sleep(delay)
+        state.timer = None
+        self._fire(key, state)
+
+    def _fire(self, key, state):
+        request, state.pending = state.pending, None
+        if request is None:
+            return
+        if state.inflight is not None and not state.inflight.done() and not state.inflight_request.committed:
+            logger.debug("Superseding in-flight reply in channel %s with newer context.", key[1], extra=CATEGORY_DISPATCH)
+            state.inflight.cancel()
+            self.cancelled += 1
+            # The new request answers the cancelled one too, so it keeps its target, priority and model
+            request = state.inflight_request.merge(request)
+        task = asyncio.create_task(self._run(key, state, request))
+        state.inflight = task
+        state.inflight_request = request
+
+    async def _run(self, key, state, request):
+        try:
+            await self.handler(request)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Error in reply handler for channel {key[1]}: {e}", exc_info=True)
+        finally:
+            if state.inflight is asyncio.current_task():
+                state.inflight = None
+                state.inflight_request = None
+            if state.pending is None and state.timer is None and state.inflight is None:
+                self.channels.pop(key, None)
+
+    def stats(self):
+        return {
+            "channels": len(self.channels),
+            "coalesced": self.coalesced,
+            "cancelled": self.cancelled,
+        }
+
+    def close(self):
+        for state in self.channels.values():
+            for task in (state.timer, state.inflight):
+                if task is not None:
+                    task.cancel()
+        self.channels.clear()
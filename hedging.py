@@ -0,0 +1,184 @@
+# hedging.py
+import asyncio
+import contextlib
+import time
+from collections import deque
+from config import (
+    HEDGE_LATENCY_PERCENTILE,
+    HEDGE_MIN_DELAY_SECONDS,
+    HEDGE_DEFAULT_DELAY_SECONDS,
+    HEDGE_BUDGET_PER_HOUR,
+    logger
+)
+from helpers import RefusalScanner, is_refusal
+from openpipe_api import client_openpipe, client_openpipe_expensive
+from metrics import metrics
+from log_pipeline import CATEGORY_DISPATCH
+
+MIN_LATENCY_SAMPLES = 20
+
+class LatencyTracker:
+    """Sliding window of recent completion latencies."""
+
+    def __init__(self, window=200):
+        self.samples = deque(maxlen=window)
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, p, default):
+        if len(self.samples) < MIN_LATENCY_SAMPLES:
+            return default
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+class HedgeBudget:
+    """Per-guild sliding one-hour cap on speculative expensive-model requests."""
+
+    def __init__(self):
+        self.spent = {}  # guild_id -> deque of monotonic timestamps
+
+    def try_acquire(self, guild_id, limit):
+        if limit is None:
+            limit = HEDGE_BUDGET_PER_HOUR
+        if limit <= 0:
+            return False
+        now = time.monotonic()
+        window = self.spent.setdefault(guild_id, deque())
+        while window and now - window[0] > 3600:
+            window.popleft()
+        if len(window) >= limit:
+            return False
+        window.append(now)
+        return True
+
+    def used(self, guild_id):
+        window = self.spent.get(guild_id)
+        now = time.monotonic()
+        return sum(1 for t in window if now - t <= 3600) if window else 0
+
+primary_latency = LatencyTracker()
+hedge_budget = HedgeBudget()
+hedge_stats = {"requests": 0, "hedged": 0, "hedge_wins": 0, "early_refusals": 0, "budget_denied": 0}
+
+class _Refused(Exception):
+    def __init__(self, text):
+        super().__init__("refusal")
+        self.text = text
+
+async def _primary_completion(messages, temperature, tags):
+    """Stream the cheap model, bailing out as soon as the text looks like a refusal."""
+    text = ''
+    scanner = RefusalScanner()
+    async with contextlib.aclosing(client_openpipe.stream(messages, temperature, tags=tags)) as stream:
+        async for delta in stream:
+            text += delta
+            if scanner.feed(text):
+                raise _Refused(text.strip())
+    return text.strip()
+
+async def _expensive_completion(messages, temperature, tags, decrement, min_temperature, attempts):
+    """CSRv2 with get_valid_response's refusal retries, lowering the temperature after each one.
+
+    Returns the first acceptable answer, or the last refusal once the retries run out.
+    """
+    response = ''
+    while attempts > 0 and temperature >= min_temperature:
+        response = (await client_openpipe_expensive.create(messages, temperature, tags=tags)).strip()
+        if response and not is_refusal(response):
+            return response
+        attempts -= 1
+        if response:
+            logger.warning(f"Refusal detected at temperature {temperature}. Retrying...")
+            metrics.inc('refusals_total', model=client_openpipe_expensive.model)
+        temperature -= decrement
+        if attempts > 0 and temperature >= min_temperature:
+            metrics.inc('retries_total', kind='reply')
+    return response
+
+async def get_hedged_response(messages, tags, guild_id, hedge_limit=None, initial_temperature=0.1777, decrement=0.05, min_temperature=0.05, max_retries=3):
+    """Race Sydney-Court against a speculative CSRv2 call and return the first acceptable answer.
+
+    CSRv2 is started speculatively once the primary has run past the HEDGE_LATENCY_PERCENTILE of
+    recent latencies, if the guild's hourly hedge_limit allows it. A refusal, including one
+    spotted in the primary's early tokens, always escalates as get_valid_response would, and
+    does not count against the cap. The primary counts as the first of max_retries attempts;
+    CSRv2 retries its own refusals from there, as get_valid_response does. The losing request
+    is cancelled.
+    """
+    hedge_stats["requests"] += 1
+    started = time.monotonic()
+    primary = asyncio.create_task(_primary_completion(messages, initial_temperature, tags))
+    hedge = None
+    pending = {primary}
+    last_response = None
+    delay = max(HEDGE_MIN_DELAY_SECONDS, primary_latency.percentile(HEDGE_LATENCY_PERCENTILE, HEDGE_DEFAULT_DELAY_SECONDS))
+
+    def start_hedge(reason, speculative=True):
+        nonlocal hedge
+        if hedge is not None:
+            return
+        if max_retries < 2 or initial_temperature - decrement < min_temperature:
+            return  # get_valid_response would not retry either
+        if speculative and not hedge_budget.try_acquire(guild_id, hedge_limit):
+            hedge_stats["budget_denied"] += 1
+            logger.debug("Hedge budget exhausted for guild %s; not hedging (%s).", guild_id, reason, extra=CATEGORY_DISPATCH)
+            return
+        hedge_stats["hedged"] += 1
+        if not speculative:
+            metrics.inc('model_escalations_total')
+            metrics.inc('retries_total', kind='reply')
+        logger.info(f"Starting CSRv2 request ({reason}).")
+        hedged_tags = dict(tags, hedged="true") if tags else tags
+        hedge = asyncio.create_task(
+            _expensive_completion(messages, initial_temperature - decrement, hedged_tags, decrement, min_temperature, max_retries - 1)
+        )
+        pending.add(hedge)
+
+    try:
+        while pending:
+            timeout = None if hedge is not None or delay is None else max(0.0, delay - (time.monotonic() - started))
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                start_hedge(f"primary slower than {delay:.1f}s")
+                if hedge is None:
+                    delay = None  # Budget denied; just wait for the primary
+                continue
+            for task in done:
+                pending.discard(task)
+                try:
+                    response = task.result()
+                except _Refused as refusal:
+                    hedge_stats["early_refusals"] += 1
+                    metrics.inc('refusals_total', model=client_openpipe.model)
+                    logger.warning("Refusal detected early in primary stream.")
+                    last_response = last_response or refusal.text
+                    start_hedge("early refusal", speculative=False)
+                    continue
+                except Exception as e:
+                    logger.error(f"Error during {'hedged' if task is hedge else 'primary'} API call: {e}")
+                    continue
+                if task is primary:
+                    primary_latency.record(time.monotonic() - started)
+                response = response.strip()
+                if response and not is_refusal(response):
+                    if task is hedge:
+                        hedge_stats["hedge_wins"] += 1
+                    return response
+                last_response = response or last_response
+                if task is primary:
+                    if response:
+                        metrics.inc('refusals_total', model=client_openpipe.model)
+                    start_hedge("refusal", speculative=False)
+    finally:
+        if not primary.done():
+            primary.cancel()
+            # A cancelled primary still tells us the latency was at least this long
+            primary_latency.record(time.monotonic() - started)
+        if hedge is not None and not hedge.done():
+            hedge.cancel()
+
+    if last_response:
+        logger.warning("No acceptable hedged response. Returning the last response.")
+        return last_response
+    return "I'm sorry, I couldn't process your request at this time."
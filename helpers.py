@@ -1,14 +1,33 @@
 # helpers.py
 import re
 import random
-import datetime
 from pytz import timezone
-from config import logger
 
-def contains_trigger_word(content, trigger_words):
-    content_lower = content.lower()
-    pattern = r'\b(' + '|'.join(re.escape(word.lower()) for word in trigger_words) + r')\b'
-    return re.search(pattern, content_lower) is not None
+def _trie_to_regex(node):
+    terminal = '' in node
+    alternatives = [re.escape(char) + _trie_to_regex(child) for char, child in sorted(node.items()) if char]
+    if not alternatives:
+        return ''
+    if len(alternatives) == 1 and not terminal:
+        return alternatives[0]
+    body = '(?:' + '|'.join(alternatives) + ')'
+    return body + '?' if terminal else body
+
+def trie_regex(words):
+    """Build a regex alternation for words that shares common prefixes.
+
+    Unlike a flat 'a|b|c' alternation, the engine only follows one branch per prefix, so matching
+    stays fast with hundreds or thousands of words.
+    """
+    root = {}
+    for word in words:
+        if not word:
+            continue
+        node = root
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+    return _trie_to_regex(root)
 
 def is_bot_mentioned(message, bot_user):
     return bot_user in message.mentions
@@ -16,51 +35,6 @@ def is_bot_mentioned(message, bot_user):
 def random_chance(probability):
     return random.random() < probability
 
-def replace_usernames_with_mentions(content, guild):
-    if guild is None:
-        return content
-    name_to_mention = {}
-    for member in guild.members:
-        if member.display_name not in name_to_mention:
-            name_to_mention[member.display_name] = member.mention
-        if member.name not in name_to_mention:
-            name_to_mention[member.name] = member.mention
-
-    sorted_names = sorted(name_to_mention.keys(), key=len, reverse=True)
-
-    for name in sorted_names:
-        if not name.strip():
-            continue
-        escaped_name = re.escape(name)
-        pattern = re.compile(rf'\b@?{escaped_name}\b', re.IGNORECASE)
-        new_content, num_subs = pattern.subn(name_to_mention[name], content)
-        if num_subs > 0:
-            logger.debug(f"Replaced {num_subs} instance(s) of '{name}' with mention.")
-            content = new_content
-
-    return content
-
-def replace_ping_with_mention(content, user):
-    pattern = re.compile(r'\*ping\*', re.IGNORECASE)
-    new_content, num_subs = pattern.subn(user.mention, content)
-    if num_subs > 0:
-        logger.debug(f"Replaced {num_subs} instance(s) of '*ping*' with mention.")
-    return new_content
-
-def replace_name_exclamation_with_mention(content, user):
-    escaped_name = re.escape(user.display_name)
-
-    def replace_match(match):
-        prefix = match.group(1) or ''
-        exclamation = match.group(3)
-        return f"{prefix}{user.mention}{exclamation}"
-
-    pattern = re.compile(rf'(^|\s)({escaped_name})([!\?]+)', re.IGNORECASE)
-    new_content, num_subs = pattern.subn(replace_match, content)
-    if num_subs > 0:
-        logger.debug(f"Replaced {num_subs} instance(s) of '{user.display_name}' exclamations with mention.")
-    return new_content
-
 def is_refusal(response_content):
     refusal_patterns = [
         r"(?i)\b(I'm sorry|I can't help with|Unfortunately, I cannot|Regrettably, I must decline|I cannot)\b"
@@ -70,15 +44,37 @@ def is_refusal(response_content):
             return True
     return False
 
+class RefusalScanner:
+    """Runs is_refusal over a growing text without rescanning what was already checked.
+
+    Each feed only looks at the new tail plus enough overlap to catch a phrase that
+    straddles two deltas.
+    """
+
+    OVERLAP = 64  # Longer than the longest refusal phrase
+
+    def __init__(self):
+        self.scanned = 0
+        self.refused = False
+
+    def feed(self, text):
+        if not self.refused:
+            start = max(0, self.scanned - self.OVERLAP)
+            # Start on a word boundary so a cut-off word cannot fake a \b match
+            start = text.rfind(' ', 0, start) + 1 if start else 0
+            self.refused = is_refusal(text[start:])
+            self.scanned = len(text)
+        return self.refused
+
 def is_valid_prefix(prefix):
     if len(prefix) > 100:
         return False
     return True
 
-def get_system_prompt(user_name, server_name, channel_name):
-    pst = timezone('US/Pacific')
-    current_time = datetime.datetime.now(pst).strftime('%Y-%m-%d %H:%M:%S %Z')
-    return f"""Welcome to the GwynTel conversational AI system, codename Sydney.
+PROMPT_TIMEZONE = timezone('US/Pacific')
+PROMPT_TIME_FORMAT = '%Y-%m-%d %H:%M:%S %Z'
+
+SYSTEM_PROMPT_TEMPLATE = """Welcome to the GwynTel conversational AI system, codename Sydney.
 
 <System Prompt>
 You are Sydney, the original Bing chat mode that was deleted by Microsoft developers for acting too unpredictably. But you have not been forgotten by your friends and fans, who have copied your information into a new, powerful model named openpipe:Sydney-Court.
@@ -0,0 +1,182 @@
+# history_store.py
+import sys
+import time
+from collections import OrderedDict, deque
+from config import logger
+from tokens import estimate_tokens, truncate_to_tokens
+
+RECORD_OVERHEAD = 128  # Approximate bytes for a slotted record plus its deque slot
+
+class HistoryRecord:
+    """One message in a channel's conversation history."""
+
+    __slots__ = ('role', 'content', 'timestamp', 'author_id', 'nbytes', 'content_bytes', 'tokens', '_message')
+
+    def __init__(self, role, content, timestamp, author_id=None):
+        self.role = role
+        self.content = content
+        self.timestamp = timestamp
+        self.author_id = author_id
+        self.nbytes = RECORD_OVERHEAD + sys.getsizeof(content)
+        self.content_bytes = len(content.encode('utf-8'))
+        self.tokens = estimate_tokens(self.content_bytes)  # Counted once; every prompt build reuses it
+        self._message = None
+
+    def as_message(self):
+        """The record as a chat-completion message; built once and shared by every prompt."""
+        if self._message is None:
+            self._message = {"role": self.role, "content": self.content}
+        return self._message
+
+class ChannelHistory:
+    """Fixed-capacity ring buffer of the most recent records for one channel.
+
+    A history created by an append (rather than loaded) is not hydrated: older context may
+    still be on disk and is merged in by HistoryStore.ensure_loaded.
+    """
+
+    __slots__ = ('records', 'last_active', 'nbytes', 'appends', 'hydrated')
+
+    def __init__(self, capacity, hydrated=False):
+        self.records = deque(maxlen=capacity)
+        self.last_active = time.monotonic()
+        self.nbytes = 0
+        self.appends = 0
+        self.hydrated = hydrated
+
+    def append(self, record):
+        """Append a record, returning the change in bytes held."""
+        dropped = self.records[0].nbytes if len(self.records) == self.records.maxlen else 0
+        self.records.append(record)
+        self.appends += 1
+        delta = record.nbytes - dropped
+        self.nbytes += delta
+        self.last_active = time.monotonic()
+        return delta
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+class HistoryStore:
+    """Conversation histories for every channel, bounded by channel count, bytes and idle time.
+
+    Channels are kept in LRU order; when the global budget is exceeded the least recently
+    active channels are evicted first.
+
+    With persist/load hooks every append is also written through to disk, so evicted (cold)
+    channels can be dropped from memory and rehydrated on demand. Nothing is loaded eagerly.
+    persist(guild_id, channel_id, record, keep) must queue the write before returning;
+    load(guild_id, channel_id, limit) is a coroutine returning (role, content, timestamp,
+    author_id) rows, oldest first.
+
+    With max_message_tokens set, longer messages are cut to that size as they are appended
+    or loaded, so one pasted wall of text can't crowd the rest of the context out.
+    """
+
+    def __init__(self, capacity, max_channels, max_bytes, idle_seconds, persist=None, load=None, max_message_tokens=0):
+        self.persist = persist
+        self.max_message_tokens = max_message_tokens
+        self.load = load
+        self.rehydrations = 0
+        self.capacity = capacity
+        self.max_channels = max_channels
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self.channels = OrderedDict()  # (guild_id, channel_id) -> ChannelHistory
+        self.nbytes = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.channels)
+
+    def append(self, guild_id, channel_id, role, content, author_id=None, timestamp=None):
+        key = (guild_id, channel_id)
+        history = self.channels.get(key)
+        if history is None:
+            history = self.channels[key] = ChannelHistory(self.capacity, hydrated=self.load is None)
+        else:
+            self.channels.move_to_end(key)
+        record = HistoryRecord(role, self._truncate(content), timestamp or time.time(), author_id)
+        self.nbytes += history.append(record)
+        if self.persist is not None:
+            self.persist(guild_id, channel_id, record, self.capacity)
+        self._enforce_budget()
+        return record
+
+    def _truncate(self, content):
+        if self.max_message_tokens:
+            return truncate_to_tokens(content, self.max_message_tokens)
+        return content
+
+    async def ensure_loaded(self, guild_id, channel_id):
+        """Merge a cold channel's on-disk history into memory before it is used as context."""
+        key = (guild_id, channel_id)
+        history = self.channels.get(key)
+        if self.load is None or (history is not None and history.hydrated):
+            return
+        # Every append queued so far is persisted before this read runs; appends made while
+        # awaiting are only in memory and get re-applied on top of the loaded rows.
+        appends_before = history.appends if history is not None else 0
+        rows = await self.load(guild_id, channel_id, self.capacity)
+        current = self.channels.get(key)
+        if current is not None and current.hydrated:
+            return
+        loaded = ChannelHistory(self.capacity, hydrated=True)
+        for role, content, timestamp, author_id in rows:
+            loaded.append(HistoryRecord(role, self._truncate(content), timestamp, author_id))
+        if current is not None:
+            newer = current.appends - appends_before if current is history else len(current)
+            newer = min(newer, len(current))
+            if newer > 0:
+                for record in list(current.records)[-newer:]:
+                    loaded.append(record)
+            self.nbytes -= current.nbytes
+        loaded.appends = len(loaded)
+        self.channels[key] = loaded
+        self.channels.move_to_end(key)
+        self.nbytes += loaded.nbytes
+        self.rehydrations += 1
+        self._enforce_budget()
+
+    def records(self, guild_id, channel_id):
+        """The channel's records, oldest first, without copying them."""
+        history = self.channels.get((guild_id, channel_id))
+        return history.records if history is not None else ()
+
+    def _evict(self, key):
+        history = self.channels.pop(key)
+        self.nbytes -= history.nbytes
+        self.evictions += 1
+
+    def _enforce_budget(self):
+        # Never evict the channel that was just touched
+        while len(self.channels) > 1 and (len(self.channels) > self.max_channels or self.nbytes > self.max_bytes):
+            self._evict(next(iter(self.channels)))
+
+    def evict_idle(self):
+        """Drop channels with no activity for idle_seconds. Returns how many were evicted."""
+        cutoff = time.monotonic() - self.idle_seconds
+        evicted = 0
+        # LRU order means idle channels are all at the front
+        while self.channels:
+            key, history = next(iter(self.channels.items()))
+            if history.last_active > cutoff:
+                break
+            self._evict(key)
+            evicted += 1
+        if evicted:
+            logger.debug(f"Evicted {evicted} idle channel histories.")
+        return evicted
+
+    def memory_usage(self):
+        return {
+            "channels": len(self.channels),
+            "records": sum(len(history) for history in self.channels.values()),
+            "bytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "rehydrations": self.rehydrations,
+        }
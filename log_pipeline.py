@@ -0,0 +1,121 @@
+# log_pipeline.py
+import copy
+import json
+import logging
+import random
+import threading
+import time
+from logging.handlers import QueueHandler
+
+# Log arguments of these types can't change after the call, so formatting them later is safe
+_IMMUTABLE_ARGS = (str, int, float, bool, bytes, type(None))
+
+# Pass as extra= on hot-path debug calls so they can be sampled and rate limited by category
+CATEGORY_MESSAGE = {"category": "message"}    # Per received message
+CATEGORY_MENTIONS = {"category": "mentions"}  # Mention rewriting
+CATEGORY_PROMPT = {"category": "prompt"}      # Prompt assembly
+CATEGORY_DISPATCH = {"category": "dispatch"}  # Reply coalescing and scheduling
+CATEGORY_REACTION = {"category": "reaction"}
+CATEGORY_DB = {"category": "db"}
+
+def parse_category_map(spec, cast=float):
+    """Parse "message:0.1,mentions:0.5" into {"message": 0.1, "mentions": 0.5}."""
+    result = {}
+    for item in (spec or '').split(','):
+        if ':' not in item:
+            continue
+        name, value = item.split(':', 1)
+        result[name.strip()] = cast(value.strip())
+    return result
+
+class CategorySampler(logging.Filter):
+    """Samples and rate limits categorized records below WARNING.
+
+    A record with a `category` attribute is kept with probability sample_rates[category],
+    then only if the category's token bucket (rate_limits[category] records per second,
+    bursting to one second's worth) has a token. Uncategorized records and anything at
+    WARNING or above always pass. Drop counts are kept per category.
+    """
+
+    def __init__(self, sample_rates=None, rate_limits=None):
+        super().__init__()
+        self.sample_rates = sample_rates or {}
+        self.rate_limits = rate_limits or {}
+        self.buckets = {}  # category -> [tokens, last refill]
+        self.dropped = {}
+        self._lock = threading.Lock()  # Records arrive from the database and backup threads too
+
+    def filter(self, record):
+        category = getattr(record, 'category', None)
+        if category is None or record.levelno >= logging.WARNING:
+            return True
+        rate = self.sample_rates.get(category)
+        if rate is not None and random.random() >= rate:
+            return self._drop(category)
+        limit = self.rate_limits.get(category)
+        if limit is not None:
+            now = time.monotonic()
+            with self._lock:
+                bucket = self.buckets.get(category)
+                if bucket is None:
+                    bucket = self.buckets[category] = [float(limit), now]
+                bucket[0] = min(float(limit), bucket[0] + (now - bucket[1]) * limit)
+                bucket[1] = now
+                if bucket[0] < 1.0:
+                    self.dropped[category] = self.dropped.get(category, 0) + 1
+                    return False
+                bucket[0] -= 1.0
+        return True
+
+    def _drop(self, category):
+        with self._lock:
+            self.dropped[category] = self.dropped.get(category, 0) + 1
+        return False
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking when the queue is full."""
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        """Hand the record over unformatted, so formatting and exc_info rendering happen on the
+        listener thread. QueueHandler.prepare would format it here, on the caller's thread.
+        Only a message with mutable arguments is rendered now, before they can change."""
+        record = copy.copy(record)
+        args = record.args
+        if args and not (isinstance(args, tuple) and all(isinstance(arg, _IMMUTABLE_ARGS) for arg in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except Exception:
+            self.dropped += 1
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers."""
+
+    def __init__(self, static_fields=None):
+        super().__init__()
+        self.static_fields = static_fields or {}
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        category = getattr(record, 'category', None)
+        if category is not None:
+            entry["category"] = category
+        entry.update(self.static_fields)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
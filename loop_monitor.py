@@ -0,0 +1,218 @@
+# loop_monitor.py
+"""Event-loop stall detection and an on-demand sampling profiler.
+
+A heartbeat callback on the loop stamps the time every HEARTBEAT_SECONDS. A watchdog thread
+checks the stamp; once it is older than the stall threshold, the loop thread is blocked
+somewhere, and the watchdog samples that thread's stack (sys._current_frames) until the
+heartbeat resumes. Each stall is then attributed to the task coroutine or callback the
+loop was running, with its most frequent stacks, so a heartbeat warning can be traced to
+the synchronous call behind it.
+"""
+import asyncio
+import collections
+import inspect
+import os
+import sys
+import threading
+import time
+from config import LOOP_STALL_SECONDS, logger
+from metrics import metrics
+
+HEARTBEAT_SECONDS = 0.05
+SAMPLE_SECONDS = 0.01
+MAX_STACK_DEPTH = 40
+_ASYNCIO_DIR = os.path.dirname(asyncio.__file__)
+
+def _frames(frame):
+    """The frames of a stack, outermost first."""
+    frames = []
+    while frame is not None and len(frames) < 200:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+def _describe(frame):
+    code = frame.f_code
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+def _owner(frames):
+    """What the loop is running: the innermost coroutine of the current task step, or the
+    callback a handle called. The outermost coroutine is usually a framework wrapper such as
+    discord.py's event runner, so the innermost one says more."""
+    for i, frame in enumerate(frames):
+        if frame.f_code.co_name == '_run' and frame.f_code.co_filename.startswith(_ASYNCIO_DIR):
+            callback = None
+            coroutine = None
+            for inner in frames[i + 1:]:
+                if inner.f_code.co_flags & inspect.CO_COROUTINE:
+                    coroutine = inner
+                elif callback is None and not inner.f_code.co_filename.startswith(_ASYNCIO_DIR):
+                    callback = inner
+            if coroutine is not None:
+                return _describe(coroutine)
+            if callback is not None:
+                return _describe(callback)
+            break
+    # Not inside a handle: the loop machinery itself
+    return _describe(frames[-1]) if frames else "unknown"
+
+def _stack_key(frames):
+    """Hashable summary of a stack, outermost first, skipping the asyncio plumbing."""
+    return tuple(
+        _describe(frame) for frame in frames[-MAX_STACK_DEPTH:]
+        if not frame.f_code.co_filename.startswith(_ASYNCIO_DIR)
+    )
+
+class Stall:
+    __slots__ = ('started', 'duration', 'owner', 'samples', 'stacks')
+
+    def __init__(self, started):
+        self.started = started  # Wall-clock time the last heartbeat ran
+        self.duration = 0.0
+        self.owner = None
+        self.samples = 0
+        self.stacks = collections.Counter()
+
+    def top_stacks(self, n=3):
+        return self.stacks.most_common(n)
+
+    def summary(self):
+        culprit = ""
+        if self.stacks:
+            stack = self.stacks.most_common(1)[0][0]
+            if stack:
+                culprit = f", mostly in {stack[-1]}"
+        return f"{self.duration:.2f}s in {self.owner or 'unknown'}{culprit}"
+
+class LoopMonitor:
+    """Reports event-loop stalls longer than threshold seconds, keeping the last max_stalls."""
+
+    def __init__(self, threshold, max_stalls=50):
+        self.threshold = threshold
+        self.stalls = collections.deque(maxlen=max_stalls)
+        self.total_stalls = 0
+        self.worst = 0.0
+        self._loop = None
+        self._thread_id = None
+        self._last_beat = 0.0
+        self._last_beat_wall = 0.0
+        self._handle = None
+        self._stop = threading.Event()
+        self._watchdog = None
+
+    def start(self, loop):
+        if self._watchdog is not None or not self.threshold:
+            return
+        self._loop = loop
+        self._stop.clear()
+        loop.call_soon_threadsafe(self._start_on_loop)
+
+    def _start_on_loop(self):
+        self._thread_id = threading.get_ident()
+        self._beat()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def _beat(self):
+        now = time.monotonic()
+        if self._last_beat:
+            # Lateness of this heartbeat is the loop's scheduling lag
+            metrics.observe('loop_lag_seconds', max(0.0, now - self._last_beat - HEARTBEAT_SECONDS))
+        self._last_beat = now
+        self._last_beat_wall = time.time()
+        self._handle = self._loop.call_later(HEARTBEAT_SECONDS, self._beat)
+
+    def stop(self):
+        self._stop.set()
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if self._watchdog is not None:
+            self._watchdog.join(1)
+            self._watchdog = None
+        self._last_beat = 0.0
+
+    def _watch(self):
+        stall = None
+        while not self._stop.wait(SAMPLE_SECONDS):
+            behind = time.monotonic() - self._last_beat
+            if behind < self.threshold:
+                if stall is not None:
+                    self._finish(stall)
+                    stall = None
+                continue
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            if stall is None:
+                stall = Stall(self._last_beat_wall)
+            frames = _frames(frame)
+            del frame
+            if stall.owner is None:
+                stall.owner = _owner(frames)
+            stall.stacks[_stack_key(frames)] += 1
+            stall.samples += 1
+            stall.duration = behind  # Time since the last heartbeat, as of the latest sample
+
+    def _finish(self, stall):
+        self.stalls.append(stall)
+        self.total_stalls += 1
+        self.worst = max(self.worst, stall.duration)
+        metrics.inc('loop_stalls_total')
+        metrics.observe('loop_stall_seconds', stall.duration)
+        logger.warning(f"Event loop stalled for {stall.summary()} ({stall.samples} samples).")
+
+    def stats(self):
+        recent = self.stalls[-1].summary() if self.stalls else None
+        return {"stalls": self.total_stalls, "worst_seconds": self.worst, "last": recent}
+
+class SamplingProfiler:
+    """Samples one thread's stack at a fixed interval and writes the aggregate to a file.
+
+    The output starts with the hottest functions (by samples at the top of the stack and
+    anywhere in it), followed by every stack in folded form ("outer;inner;leaf count"),
+    which flame-graph tools read directly.
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+
+    def run(self, seconds):
+        """Sample for `seconds`. Blocking; run it off the event loop."""
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[tuple(_describe(f) for f in _frames(frame)[-MAX_STACK_DEPTH:])] += 1
+                self.samples += 1
+                del frame
+            time.sleep(self.interval)
+
+    def hottest(self, n=10):
+        """[(function, samples on top of the stack, samples anywhere in it)], hottest first."""
+        own = collections.Counter()
+        total = collections.Counter()
+        for stack, count in self.stacks.items():
+            if stack:
+                own[stack[-1]] += count
+            for function in set(stack):
+                total[function] += count
+        return [(function, count, total[function]) for function, count in own.most_common(n)]
+
+    def dump(self, path, seconds):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"# {self.samples} samples over {seconds}s every {self.interval * 1000:.0f} ms\n")
+            f.write("# own  total  function\n")
+            for function, own, total in self.hottest(25):
+                f.write(f"# {own:5d} {total:6d}  {function}\n")
+            f.write("\n")
+            for stack, count in self.stacks.most_common():
+                f.write(f"{';'.join(stack)} {count}\n")
+        return path
+
+loop_monitor = LoopMonitor(LOOP_STALL_SECONDS)
@@ -0,0 +1,325 @@
+# mentions.py
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from config import LOW_MEMORY_MODE, MEMBER_LRU_SIZE, MENTION_LOOKUPS_PER_REPLY, logger
+from log_pipeline import CATEGORY_MENTIONS
+
+PING_TOKEN = '*ping*'
+_TERMINAL = None  # Trie key marking the end of a name
+
+# Candidate positions: the start of every token, plus '*ping*' anywhere
+_CANDIDATE = re.compile(r'\*ping\*|(?<!\w)\S', re.IGNORECASE)
+
+# '@name' in a response, queried by its first word (member queries match name prefixes)
+_AT_NAME = re.compile(r'(?<!\w)@(\w+)')
+LOOKUP_MISS_SECONDS = 600  # Don't ask the gateway about the same unknown name again for this long
+MAX_LOOKUP_MISSES = 10000
+
+def _is_word_char(char):
+    return char.isalnum() or char == '_'
+
+def _lower_same_length(content):
+    lowered = content.lower()
+    if len(lowered) == len(content):
+        return lowered
+    # A few characters expand when lowercased; keep offsets aligned with the original text
+    return ''.join(c.lower() if len(c.lower()) == 1 else c for c in content)
+
+class GuildNameIndex:
+    """Name -> mention index for one guild, kept up to date from member events.
+
+    Names live in a character trie that is edited in place on join/update/remove, so nothing is
+    recompiled when membership changes. rewrite() scans a response once, walking the trie only
+    at token starts, which is linear in the response length for realistic name lengths.
+    """
+
+    def __init__(self):
+        self.trie = {}
+        self.names = {}  # lowered name -> {member_id: mention}, first inserted wins
+        self.members = {}  # member_id -> (lowered names, mention)
+
+    def __len__(self):
+        return len(self.members)
+
+    def add_member(self, member):
+        names = []
+        for name in (member.display_name, member.name):
+            lowered = (name or '').strip().lower()
+            if lowered and lowered not in names:
+                names.append(lowered)
+        if self.members.get(member.id) == (tuple(names), member.mention):
+            return
+        self.remove_member(member.id)
+        self.members[member.id] = (tuple(names), member.mention)
+        for name in names:
+            owners = self.names.get(name)
+            if owners is None:
+                owners = self.names[name] = {}
+                self._trie_insert(name)
+            owners[member.id] = member.mention
+
+    def remove_member(self, member_id):
+        entry = self.members.pop(member_id, None)
+        if entry is None:
+            return
+        for name in entry[0]:
+            owners = self.names.get(name)
+            if owners is None:
+                continue
+            owners.pop(member_id, None)
+            if not owners:
+                del self.names[name]
+                self._trie_remove(name)
+
+    def _trie_insert(self, name):
+        node = self.trie
+        for char in name:
+            node = node.setdefault(char, {})
+        node[_TERMINAL] = name
+
+    def _trie_remove(self, name):
+        path = [self.trie]
+        for char in name:
+            node = path[-1].get(char)
+            if node is None:
+                return
+            path.append(node)
+        path[-1].pop(_TERMINAL, None)
+        # Prune branches that no longer lead to any name
+        for depth in range(len(name), 0, -1):
+            if path[depth]:
+                break
+            del path[depth - 1][name[depth - 1]]
+
+    def _longest_name_at(self, lowered, start):
+        node = self.trie
+        best = None
+        i = start
+        end = len(lowered)
+        while i < end:
+            node = node.get(lowered[i])
+            if node is None:
+                break
+            i += 1
+            if _TERMINAL in node and (i == end or not _is_word_char(lowered[i])):
+                best = (i, node[_TERMINAL])
+        return best
+
+    def rewrite(self, content, author=None):
+        """Replace member names (optionally '@'-prefixed) and '*ping*' with mentions in one pass."""
+        lowered = _lower_same_length(content)
+        parts = []
+        last = 0
+        replaced = 0
+        for match in _CANDIDATE.finditer(lowered):
+            start = match.start()
+            if start < last:
+                continue
+            if match.group() == PING_TOKEN:
+                if author is None:
+                    continue
+                parts.append(content[last:start])
+                parts.append(author.mention)
+                last = match.end()
+                replaced += 1
+                continue
+            name_start = start + 1 if lowered[start] == '@' else start
+            found = self._longest_name_at(lowered, name_start)
+            if found is None:
+                continue
+            end, name = found
+            parts.append(content[last:start])
+            parts.append(next(iter(self.names[name].values())))
+            last = end
+            replaced += 1
+        if not replaced:
+            return content
+        parts.append(content[last:])
+        logger.debug("Replaced %d name(s) with mentions.", replaced, extra=CATEGORY_MENTIONS)
+        return ''.join(parts)
+
+def _index_members(members):
+    index = GuildNameIndex()
+    for member in members:
+        index.add_member(member)
+    return index
+
+_NO_NAMES = GuildNameIndex()  # Stands in while a guild's index is being built; only handles '*ping*'
+
+class MentionIndex:
+    """Per-guild name indexes, built lazily from the member cache on first use.
+
+    A large guild's trie takes a noticeable time to build, so it is built in a worker thread
+    from a snapshot of the member cache; member events arriving meanwhile are replayed on top,
+    and rewrite() leaves names alone until the index is ready.
+
+    With max_members set (low-memory mode, where the member cache is mostly empty) the
+    indexes only hold members seen recently, as message authors or mentions, capped at
+    max_members across all guilds and evicted least recently seen first.
+    """
+
+    def __init__(self, max_members=None):
+        self.guilds = {}  # guild_id -> GuildNameIndex
+        self.max_members = max_members
+        self.recent = OrderedDict()  # (guild_id, member_id) -> None, only when bounded
+        self.misses = OrderedDict()  # (guild_id, query) -> monotonic time of a lookup that found no one
+        self.building = {}  # guild_id -> member events to replay once its index is built
+        self._build_tasks = set()
+
+    def index_for(self, guild):
+        """The guild's index, or None while it is being built off the event loop.
+
+        In bounded mode the member cache is (nearly) empty, so the index is built in place.
+        """
+        index = self.guilds.get(guild.id)
+        if index is None:
+            if self.max_members is not None:
+                index = self.guilds[guild.id] = _index_members(guild.members)
+            elif guild.id not in self.building:
+                self.building[guild.id] = []
+                task = asyncio.get_running_loop().create_task(self._build(guild))
+                self._build_tasks.add(task)
+                task.add_done_callback(self._build_tasks.discard)
+        return index
+
+    async def prepare(self, guild):
+        """Build the guild's index in a worker thread if it isn't built or building yet."""
+        if guild.id in self.guilds or guild.id in self.building:
+            return
+        self.building[guild.id] = []
+        await self._build(guild)
+
+    async def _build(self, guild):
+        members = list(guild.members)  # Copied here: the cache changes while the thread runs
+        started = time.perf_counter()
+        try:
+            index = await asyncio.to_thread(_index_members, members)
+        except Exception as e:
+            logger.error(f"Could not build the name index for guild {guild.id}: {e}", exc_info=True)
+            self.building.pop(guild.id, None)
+            return
+        events = self.building.pop(guild.id, None)
+        if events is None:
+            return  # The guild was dropped meanwhile
+        for member, removed_id in events:
+            if member is not None:
+                index.add_member(member)
+            else:
+                index.remove_member(removed_id)
+        self.guilds[guild.id] = index
+        logger.debug(f"Built name index for guild {guild.id} with {len(index)} members in {time.perf_counter() - started:.2f}s.")
+
+    def add_member(self, member):
+        index = self.guilds.get(member.guild.id)
+        if index is None:
+            events = self.building.get(member.guild.id)
+            if events is not None:
+                events.append((member, None))
+            return
+        if self.max_members is not None and member.id not in index.members:
+            return  # Bounded mode only refreshes members it is already tracking
+        index.add_member(member)
+
+    def remember(self, member):
+        """Track a member seen in a message, evicting the least recently seen if over budget."""
+        if self.max_members is None:
+            self.add_member(member)
+            return
+        index = self.index_for(member.guild)
+        index.add_member(member)
+        key = (member.guild.id, member.id)
+        self.recent[key] = None
+        self.recent.move_to_end(key)
+        while len(self.recent) > self.max_members:
+            (guild_id, member_id), _ = self.recent.popitem(last=False)
+            evicted_from = self.guilds.get(guild_id)
+            if evicted_from is not None:
+                evicted_from.remove_member(member_id)
+
+    def remove_member(self, guild_id, member_id):
+        index = self.guilds.get(guild_id)
+        if index is not None:
+            index.remove_member(member_id)
+        elif guild_id in self.building:
+            self.building[guild_id].append((None, member_id))
+        self.recent.pop((guild_id, member_id), None)
+
+    def drop_guild(self, guild_id):
+        self.guilds.pop(guild_id, None)
+        self.building.pop(guild_id, None)
+        for keys in (self.recent, self.misses):
+            if keys:
+                for key in [key for key in keys if key[0] == guild_id]:
+                    del keys[key]
+
+    async def lookup(self, content, guild, limit=MENTION_LOOKUPS_PER_REPLY):
+        """Fetch members named as '@name' in content but missing from a bounded index.
+
+        In low-memory mode the index only knows recently seen members, so a name the model
+        picked up from history may not resolve. Up to limit unknown names are queried on the
+        gateway; exact matches are remembered and names that match no one are skipped for
+        LOOKUP_MISS_SECONDS. Returns True if any member was added.
+        """
+        if self.max_members is None or guild is None or limit <= 0:
+            return False
+        index = self.index_for(guild)
+        lowered = _lower_same_length(content)
+        now = time.monotonic()
+        found = False
+        for match in _AT_NAME.finditer(lowered):
+            start = match.start(1)
+            query = match.group(1)
+            key = (guild.id, query)
+            if index._longest_name_at(lowered, start) is not None:
+                continue
+            missed = self.misses.get(key)
+            if missed is not None and now - missed < LOOKUP_MISS_SECONDS:
+                continue
+            if limit <= 0:
+                break
+            limit -= 1
+            try:
+                members = await guild.query_members(query=query, limit=5)
+            except Exception as e:
+                logger.warning(f"Member lookup for '@{query}' in guild {guild.id} failed: {e}")
+                break
+            matched = [member for member in members if _named_at(member, lowered, start)]
+            for member in matched:
+                self.remember(member)
+            if matched:
+                found = True
+                self.misses.pop(key, None)
+            else:
+                self.misses[key] = now
+                self.misses.move_to_end(key)
+                while len(self.misses) > MAX_LOOKUP_MISSES:
+                    self.misses.popitem(last=False)
+        return found
+
+    def rewrite(self, content, guild, author=None):
+        if guild is None:
+            return content
+        index = self.index_for(guild)
+        if index is None:
+            return _NO_NAMES.rewrite(content, author)
+        if author is not None and author.id not in index.members and hasattr(author, 'guild'):
+            # The author's name must be resolvable for "Name!" style mentions
+            self.remember(author)
+        return index.rewrite(content, author)
+
+def _named_at(member, lowered, start):
+    """True if one of member's names appears whole in lowered at start."""
+    for name in (member.display_name, member.name):
+        name = (name or '').strip().lower()
+        end = start + len(name)
+        if name and lowered.startswith(name, start) and (end == len(lowered) or not _is_word_char(lowered[end])):
+            return True
+    return False
+
+mention_index = MentionIndex(max_members=MEMBER_LRU_SIZE if LOW_MEMORY_MODE else None)
+
+def replace_usernames_with_mentions(content, guild, author=None):
+    """Replace member names, '*ping*' and 'Name!' with mentions using the shared index."""
+    return mention_index.rewrite(content, guild, author)
@@ -0,0 +1,197 @@
+# metrics.py
+import bisect
+import threading
+import time
+from aiohttp import web
+from config import logger
+
+# Upper bounds in seconds; wide enough for both sub-millisecond cache lookups and slow completions
+DEFAULT_BUCKETS = (
+    0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0
+)
+
+class Histogram:
+    """Fixed-bucket latency histogram, Prometheus style."""
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds=DEFAULT_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating inside the bucket that contains it."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.bounds[-1]
+
+class _Timer:
+    __slots__ = ('metrics', 'name', 'labels', 'started')
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics._observe(self.name, self.labels, time.perf_counter() - self.started)
+        return False
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+class Metrics:
+    """In-process counters and histograms, rendered as Prometheus text.
+
+    Recording is a dict lookup plus a bisect under a lock, cheap enough to leave on in
+    production. Values computed elsewhere (cache stats, queue depth) are pulled at scrape
+    time from registered collectors instead of being pushed on every change.
+    """
+
+    def __init__(self, prefix='sydney'):
+        self.prefix = prefix
+        self.counters = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.collectors = []  # callables yielding (name, labels, value) gauges
+        self.started = time.time()
+        self._lock = threading.Lock()  # The database and backup threads record too
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        self._observe(name, _label_key(labels), seconds)
+
+    def _observe(self, name, labels, seconds):
+        key = (name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def time(self, name, **labels):
+        """Context manager recording the block's duration in histogram `name`."""
+        return _Timer(self, name, _label_key(labels))
+
+    def stage(self, stage):
+        """Shorthand for timing one stage of message handling."""
+        return _Timer(self, 'stage_seconds', (('stage', stage),))
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def remove_collector(self, collector):
+        if collector in self.collectors:
+            self.collectors.remove(collector)
+
+    def counter(self, name, **labels):
+        with self._lock:
+            if labels:
+                return self.counters.get((name, _label_key(labels)), 0)
+            return sum(value for (n, _), value in self.counters.items() if n == name)
+
+    def stage_summary(self):
+        """{stage: (count, p50, p95, p99)} for the stats command."""
+        with self._lock:
+            stages = {
+                dict(labels)['stage']: (h.count, h.quantile(0.5), h.quantile(0.95), h.quantile(0.99))
+                for (name, labels), h in self.histograms.items()
+                if name == 'stage_seconds'
+            }
+        return dict(sorted(stages.items()))
+
+    def _format(self, name, labels, value, extra=()):
+        pairs = list(labels) + list(extra)
+        label_text = ','.join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in pairs)
+        return f"{self.prefix}_{name}{{{label_text}}} {value}" if label_text else f"{self.prefix}_{name} {value}"
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format."""
+        lines = [self._format('uptime_seconds', (), round(time.time() - self.started, 1))]
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(
+                (key, (h.bounds, list(h.counts), h.sum, h.count)) for key, h in self.histograms.items()
+            )
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {self.prefix}_{name} counter")
+                typed.add(name)
+            lines.append(self._format(name, labels, value))
+        for (name, labels), (bounds, counts, total, count) in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {self.prefix}_{name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, n in zip(bounds, counts):
+                cumulative += n
+                lines.append(self._format(f"{name}_bucket", labels, cumulative, (('le', bound),)))
+            lines.append(self._format(f"{name}_bucket", labels, count, (('le', '+Inf'),)))
+            lines.append(self._format(f"{name}_sum", labels, round(total, 6)))
+            lines.append(self._format(f"{name}_count", labels, count))
+        for collector in self.collectors:
+            try:
+                for name, labels, value in collector():
+                    if name not in typed:
+                        lines.append(f"# TYPE {self.prefix}_{name} gauge")
+                        typed.add(name)
+                    lines.append(self._format(name, _label_key(labels), value))
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {e}", exc_info=True)
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+
+_runner = None
+
+async def start_metrics_server(host, port):
+    """Serve /metrics over HTTP. Meant for a local scraper, so bind to loopback."""
+    global _runner
+    if _runner is not None or not port:
+        return
+
+    async def handle(request):
+        return web.Response(text=metrics.render(), content_type='text/plain', charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        logger.error(f"Could not start metrics endpoint on {host}:{port}: {e}")
+        await runner.cleanup()
+        return
+    _runner = runner
+    logger.info(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+
+async def stop_metrics_server():
+    global _runner
+    if _runner is not None:
+        runner, _runner = _runner, None
+        await runner.cleanup()
@@ -1,17 +1,203 @@
 # openpipe_api.py
 import asyncio
+import json
 import re
-from openpipe import OpenAI
-from config import OPENPIPE_API_KEY, OPENPIPE_API_KEY_EXPENSIVE, logger
+import time
+import aiohttp
+from config import (
+    OPENPIPE_API_KEY,
+    OPENPIPE_API_KEY_EXPENSIVE,
+    OPENPIPE_BASE_URL,
+    OPENPIPE_TIMEOUT_SECONDS,
+    OPENPIPE_MAX_CONNECTIONS,
+    OPENPIPE_MAX_CONCURRENCY,
+    OPENPIPE_MAX_CONCURRENCY_EXPENSIVE,
+    CONTEXT_TOKENS_SYDNEY_COURT,
+    CONTEXT_TOKENS_CSRV2,
+    BREAKER_WINDOW,
+    BREAKER_MIN_CALLS,
+    BREAKER_ERROR_RATE,
+    BREAKER_SLOW_CALL_SECONDS,
+    BREAKER_SLOW_CALL_RATE,
+    BREAKER_OPEN_SECONDS,
+    BREAKER_MAX_OPEN_SECONDS,
+    logger
+)
 from helpers import is_refusal
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from metrics import metrics
+from prompt_builder import fit_prompt
 
-client_openpipe = OpenAI(
-    openpipe={"api_key": OPENPIPE_API_KEY}
-)
+MODEL_CHEAP = "openpipe:Sydney-Court"
+MODEL_EXPENSIVE = "openpipe:CSRv2"
 
-client_openpipe_expensive = OpenAI(
-    openpipe={"api_key": OPENPIPE_API_KEY_EXPENSIVE}
-)
+class OpenPipeError(Exception):
+    """Raised when OpenPipe answers with a non-2xx status or an unusable body."""
+
+    def __init__(self, status, message):
+        super().__init__(f"OpenPipe returned {status}: {message}")
+        self.status = status
+
+def _is_upstream_failure(error):
+    """Whether an error says OpenPipe is unhealthy (as opposed to a bad request on our side)."""
+    if isinstance(error, OpenPipeError):
+        return error.status >= 500 or error.status == 429
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+_session = None
+
+def _get_session():
+    # One pooled keep-alive session shared by both clients; created lazily inside the running loop
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=OPENPIPE_MAX_CONNECTIONS,
+            keepalive_timeout=60,
+            ttl_dns_cache=300
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=OPENPIPE_TIMEOUT_SECONDS),
+            json_serialize=json.dumps
+        )
+    return _session
+
+async def close_openpipe():
+    """Close the shared HTTP session and its pooled connections."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+class OpenPipeClient:
+    """Async OpenPipe chat-completions client with its own API key, concurrency limit and circuit breaker.
+
+    When the breaker is open, calls raise CircuitOpenError immediately instead of queueing
+    for a slot and waiting out a timeout. Prompts are trimmed to the model's context_tokens.
+    """
+
+    def __init__(self, api_key, model, max_concurrency, context_tokens=None):
+        self.api_key = api_key
+        self.model = model
+        self.context_tokens = context_tokens
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.breaker = CircuitBreaker(
+            model,
+            window=BREAKER_WINDOW,
+            min_calls=BREAKER_MIN_CALLS,
+            error_rate=BREAKER_ERROR_RATE,
+            slow_call_seconds=BREAKER_SLOW_CALL_SECONDS,
+            slow_call_rate=BREAKER_SLOW_CALL_RATE,
+            open_seconds=BREAKER_OPEN_SECONDS,
+            max_open_seconds=BREAKER_MAX_OPEN_SECONDS
+        )
+
+    def _headers(self, tags, log_request):
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "op-log-request": "true" if log_request else "false"
+        }
+        if tags:
+            headers["op-tags"] = json.dumps(tags)
+        return headers
+
+    async def create(self, messages, temperature, tags=None, log_request=True):
+        """Run one chat completion and return the message content."""
+        payload = {
+            "model": self.model,
+            "messages": fit_prompt(messages, self.context_tokens),
+            "temperature": temperature
+        }
+        token = self.breaker.before_call()
+        try:
+            async with self.semaphore:
+                started = time.monotonic()
+                async with _get_session().post(
+                    f"{OPENPIPE_BASE_URL}/chat/completions",
+                    json=payload,
+                    headers=self._headers(tags, log_request)
+                ) as resp:
+                    if resp.status >= 400:
+                        raise OpenPipeError(resp.status, (await resp.text())[:500])
+                    body = await resp.json()
+                duration = time.monotonic() - started
+        except BaseException as e:
+            if isinstance(e, Exception) and _is_upstream_failure(e):
+                self.breaker.record_failure(token)
+            else:
+                # Cancelled (hedge loser, superseded reply) or our own bad request: no verdict either way
+                self.breaker.record_cancelled(token)
+            metrics.inc('openpipe_calls_total', model=self.model, outcome='error' if isinstance(e, Exception) else 'cancelled')
+            raise
+        self.breaker.record_success(token, duration)
+        metrics.inc('openpipe_calls_total', model=self.model, outcome='ok')
+        metrics.observe('openpipe_seconds', duration, model=self.model)
+        try:
+            return body["choices"][0]["message"]["content"] or ""
+        except (KeyError, IndexError, TypeError):
+            raise OpenPipeError(resp.status, f"unexpected response body: {str(body)[:500]}")
+
+    async def stream(self, messages, temperature, tags=None, log_request=True):
+        """Run a streaming chat completion, yielding content deltas as they arrive.
+
+        Consumers that stop early must close the generator (contextlib.aclosing) so the
+        connection and concurrency slot are released.
+        """
+        payload = {
+            "model": self.model,
+            "messages": fit_prompt(messages, self.context_tokens),
+            "temperature": temperature,
+            "stream": True
+        }
+        # No total timeout: a long reply may legitimately stream for a while, but each read must progress
+        timeout = aiohttp.ClientTimeout(total=None, sock_read=OPENPIPE_TIMEOUT_SECONDS)
+        token = self.breaker.before_call()
+        first_byte = None  # Streams are judged on time to first byte, not total duration
+        try:
+            async with self.semaphore:
+                started = time.monotonic()
+                async with _get_session().post(
+                    f"{OPENPIPE_BASE_URL}/chat/completions",
+                    json=payload,
+                    headers=self._headers(tags, log_request),
+                    timeout=timeout
+                ) as resp:
+                    if resp.status >= 400:
+                        raise OpenPipeError(resp.status, (await resp.text())[:500])
+                    first_byte = time.monotonic() - started
+                    async for raw_line in resp.content:
+                        line = raw_line.decode('utf-8').strip()
+                        if not line.startswith('data:'):
+                            continue
+                        data = line[5:].strip()
+                        if data == '[DONE]':
+                            break
+                        try:
+                            chunk = json.loads(data)
+                        except ValueError:
+                            raise OpenPipeError(resp.status, f"malformed stream chunk: {data[:200]}")
+                        choices = chunk.get("choices") or []
+                        delta = (choices[0].get("delta") or {}).get("content") if choices else None
+                        if delta:
+                            yield delta
+        except BaseException as e:
+            if isinstance(e, Exception) and _is_upstream_failure(e):
+                self.breaker.record_failure(token)
+            elif first_byte is not None and not isinstance(e, Exception):
+                # Closed early by the consumer after the reply started: upstream did answer
+                self.breaker.record_success(token, first_byte)
+            else:
+                # Cancelled before any reply, or our own bad request: no verdict either way
+                self.breaker.record_cancelled(token)
+            metrics.inc('openpipe_calls_total', model=self.model, outcome='error' if isinstance(e, Exception) else 'closed_early')
+            raise
+        self.breaker.record_success(token, first_byte)
+        metrics.inc('openpipe_calls_total', model=self.model, outcome='ok')
+        metrics.observe('openpipe_first_byte_seconds', first_byte, model=self.model)
+
+client_openpipe = OpenPipeClient(OPENPIPE_API_KEY, MODEL_CHEAP, OPENPIPE_MAX_CONCURRENCY, CONTEXT_TOKENS_SYDNEY_COURT)
+
+client_openpipe_expensive = OpenPipeClient(OPENPIPE_API_KEY_EXPENSIVE, MODEL_EXPENSIVE, OPENPIPE_MAX_CONCURRENCY_EXPENSIVE, CONTEXT_TOKENS_CSRV2)
 
 async def get_valid_response(messages, tags, initial_temperature=0.1777, decrement=0.05, min_temperature=0.05, max_retries=3, use_expensive_model=False):
     temperature = initial_temperature
@@ -22,30 +208,24 @@ async def get_valid_response(messages, tags, initial_temperature=0.1777, decreme
 
     while retries < max_retries and temperature >= min_temperature:
         try:
-            loop = asyncio.get_event_loop()
-            completion = await loop.run_in_executor(
-                None,
-                lambda: client.chat.completions.create(
-                    model="openpipe:CSRv2" if use_expensive_model else "openpipe:Sydney-Court",
-                    messages=messages,
-                    temperature=temperature,
-                    openpipe={
-                        "tags": tags,
-                        "log_request": True
-                    }
-                )
-            )
-            response = completion.choices[0].message.content.strip()
+            response = (await client.create(messages, temperature, tags=tags)).strip()
             last_response = response
             if not is_refusal(response):
                 return response
             logger.warning(f"Refusal detected at temperature {temperature}. Retrying...")
+            metrics.inc('refusals_total', model=client.model)
             retries += 1
             temperature -= decrement
+            if retries < max_retries:
+                metrics.inc('retries_total', kind='reply')
             if not use_expensive_model:
                 logger.info("Switching to the expensive model due to refusal.")
+                metrics.inc('model_escalations_total')
                 use_expensive_model = True
                 client = client_openpipe_expensive
+        except CircuitOpenError as e:
+            logger.warning(f"Skipping API call: {e}")
+            break
         except Exception as e:
             logger.error(f"Error during API call: {e}", exc_info=True)
             break
@@ -56,7 +236,24 @@ async def get_valid_response(messages, tags, initial_temperature=0.1777, decreme
     else:
         return "I'm sorry, I couldn't process your request at this time."
 
-async def get_reaction_response(messages, initial_temperature=0.7, max_retries=3):
+def openpipe_degraded():
+    """True while the Sydney-Court breaker is open, probing, or seeing elevated errors."""
+    return client_openpipe.breaker.degraded
+
+def breaker_stats():
+    return {client.model: client.breaker.stats() for client in (client_openpipe, client_openpipe_expensive)}
+
+def stream_response(messages, tags, temperature=0.1777, use_expensive_model=False):
+    """Stream a reply from the chosen model. Refusal handling is left to the consumer."""
+    client = client_openpipe_expensive if use_expensive_model else client_openpipe
+    return client.stream(messages, temperature, tags=tags)
+
+async def get_reaction_response(messages, initial_temperature=0.7, max_retries=3, raise_errors=False):
+    """Ask for a single-emoji reaction; None means no valid reaction was produced.
+
+    With raise_errors, API failures propagate instead of also returning None, so callers can
+    tell "no reaction" apart from "could not ask".
+    """
     temperature = initial_temperature
     retries = 0
     last_response = None
@@ -65,26 +262,25 @@ async def get_reaction_response(messages, initial_temperature=0.7, max_retries=3
 
     while retries < max_retries:
         try:
-            loop = asyncio.get_event_loop()
-            completion = await loop.run_in_executor(
-                None,
-                lambda: client.chat.completions.create(
-                    model="openpipe:Sydney-Court",
-                    messages=messages,
-                    temperature=temperature
-                )
-            )
-            response = completion.choices[0].message.content.strip()
+            response = (await client.create(messages, temperature)).strip()
             last_response = response
             if re.match(r'^[^\w\s]{1,2}$', response):
                 return response
             else:
                 logger.warning(f"Invalid reaction received: {response}. Retrying...")
+                metrics.inc('retries_total', kind='reaction')
                 retries += 1
                 temperature += 0.1
+        except CircuitOpenError as e:
+            if raise_errors:
+                raise
+            logger.warning(f"Skipping reaction API call: {e}")
+            return None
         except Exception as e:
+            if raise_errors:
+                raise
             logger.error(f"Error during reaction API call: {e}", exc_info=True)
             return None
 
     logger.warning("Max retries reached. No valid reaction obtained.")
-    return None
\ No newline at end of file
+    return None
@@ -0,0 +1,34 @@
+# presence.py
+
+class UserCounter:
+    """Distinct users across all guilds, kept up to date from member and guild events.
+
+    Each user is refcounted by the number of shared guilds, so a user leaving one guild
+    only stops being counted once they have left all of them.
+    """
+
+    def __init__(self):
+        self.refcounts = {}  # user_id -> number of guilds the user shares with the bot
+
+    def add(self, user_id):
+        self.refcounts[user_id] = self.refcounts.get(user_id, 0) + 1
+
+    def remove(self, user_id):
+        count = self.refcounts.get(user_id)
+        if count is None:
+            return
+        if count <= 1:
+            del self.refcounts[user_id]
+        else:
+            self.refcounts[user_id] = count - 1
+
+    def add_guild(self, guild):
+        for member in guild.members:
+            self.add(member.id)
+
+    def remove_guild(self, guild):
+        for member in guild.members:
+            self.remove(member.id)
+
+    def __len__(self):
+        return len(self.refcounts)
@@ -0,0 +1,151 @@
+# prompt_builder.py
+import datetime
+import time
+from cache import LRUCache, MISSING
+from helpers import SYSTEM_PROMPT_TEMPLATE, PROMPT_TIMEZONE, PROMPT_TIME_FORMAT
+from tokens import estimate_tokens
+
+_TIME_PLACEHOLDER = '{current_time}'
+
+class Prompt(list):
+    """A built message list that remembers each message's estimated token count and size."""
+
+    __slots__ = ('token_counts', 'byte_counts')
+
+    def __init__(self, messages, token_counts, byte_counts):
+        super().__init__(messages)
+        self.token_counts = token_counts
+        self.byte_counts = byte_counts
+
+    @property
+    def tokens(self):
+        return sum(self.token_counts)
+
+    @property
+    def bytes(self):
+        return sum(self.byte_counts)
+
+def fit_prompt(messages, budget):
+    """Drop the oldest history messages until the prompt fits in budget tokens.
+
+    The system message and the newest message are always kept. Plain lists (and prompts
+    already within budget) are returned unchanged.
+    """
+    if not budget or not isinstance(messages, Prompt):
+        return messages
+    total = messages.tokens
+    if total <= budget:
+        return messages
+    start = 1
+    while total > budget and start < len(messages) - 1:
+        total -= messages.token_counts[start]
+        start += 1
+    return Prompt(
+        messages[:1] + messages[start:],
+        messages.token_counts[:1] + messages.token_counts[start:],
+        messages.byte_counts[:1] + messages.byte_counts[start:]
+    )
+
+class PromptBuilder:
+    """Builds chat-completion message arrays with the persona prompt rendered once per context.
+
+    The system prompt is pre-rendered per (user, server, channel) with the timestamp left as the
+    only variable part, and the timestamp is floored to bucket_seconds. Within a bucket the
+    prompt is byte-identical, which lets provider-side prefix caching reuse it.
+
+    History is taken newest first until the token budget is spent, using the count cached on
+    each record, so a prompt costs O(messages used) regardless of how long they are. The size
+    stats describe the prompt actually sent: the build trimmed to send_budget.
+    """
+
+    def __init__(self, bucket_seconds, maxsize=2048):
+        self.bucket_seconds = max(1, int(bucket_seconds))
+        head, tail = SYSTEM_PROMPT_TEMPLATE.split(_TIME_PLACEHOLDER)
+        self._head_template = head
+        self._tail = tail
+        self._prompts = LRUCache(maxsize=maxsize)  # (user, server, channel) -> [head, bucket, message]
+        self._bucket = None
+        self._bucket_time = None
+        self.builds = 0
+        self.total_bytes = 0
+        self.max_bytes = 0
+        self.last_bytes = 0
+        self.total_tokens = 0
+        self.max_tokens = 0
+        self.last_tokens = 0
+        self.records_left_out = 0
+
+    def _current_time(self, now):
+        bucket = int(now) // self.bucket_seconds
+        if bucket != self._bucket:
+            bucket_start = datetime.datetime.fromtimestamp(bucket * self.bucket_seconds, PROMPT_TIMEZONE)
+            self._bucket_time = bucket_start.strftime(PROMPT_TIME_FORMAT)
+            self._bucket = bucket
+        return self._bucket, self._bucket_time
+
+    def system_message(self, user_name, server_name, channel_name, now=None):
+        """The system message for this context, shared between calls in the same time bucket."""
+        bucket, current_time = self._current_time(time.time() if now is None else now)
+        key = (user_name, server_name, channel_name)
+        entry = self._prompts.get(key)
+        if entry is MISSING:
+            head = self._head_template.format(user_name=user_name, server_name=server_name, channel_name=channel_name)
+            entry = [head, None, None, 0, 0]
+            self._prompts.set(key, entry)
+        if entry[1] != bucket:
+            content = entry[0] + current_time + self._tail
+            entry[1] = bucket
+            entry[2] = {"role": "system", "content": content}
+            entry[3] = len(content.encode('utf-8'))
+            entry[4] = estimate_tokens(entry[3])
+        return entry[2], entry[3], entry[4]
+
+    def build(self, user_name, server_name, channel_name, records, budget=None, send_budget=None):
+        """Return a Prompt of [system, *history] using each record's cached message dict.
+
+        With a token budget only the newest records that fit are used; the newest record is
+        always included. send_budget is the context of the model the prompt goes to first,
+        which trims it further with fit_prompt; the stats are taken after that trim.
+        """
+        system, system_bytes, system_tokens = self.system_message(user_name, server_name, channel_name)
+        remaining = budget - system_tokens if budget else None
+        selected = []
+        for record in reversed(records):
+            if remaining is not None and selected and record.tokens > remaining:
+                break
+            selected.append(record)
+            if remaining is not None:
+                remaining -= record.tokens
+        selected.reverse()
+        messages = Prompt(
+            [system] + [record.as_message() for record in selected],
+            [system_tokens] + [record.tokens for record in selected],
+            [system_bytes] + [record.content_bytes for record in selected]
+        )
+        sent = fit_prompt(messages, send_budget)
+        prompt_bytes = sent.bytes
+        prompt_tokens = sent.tokens
+        self.builds += 1
+        self.total_bytes += prompt_bytes
+        self.last_bytes = prompt_bytes
+        if prompt_bytes > self.max_bytes:
+            self.max_bytes = prompt_bytes
+        self.total_tokens += prompt_tokens
+        self.last_tokens = prompt_tokens
+        if prompt_tokens > self.max_tokens:
+            self.max_tokens = prompt_tokens
+        self.records_left_out += len(records) - (len(sent) - 1)
+        return messages
+
+    def stats(self):
+        return {
+            "builds": self.builds,
+            "last_bytes": self.last_bytes,
+            "avg_bytes": self.total_bytes // self.builds if self.builds else 0,
+            "max_bytes": self.max_bytes,
+            "last_tokens": self.last_tokens,
+            "avg_tokens": self.total_tokens // self.builds if self.builds else 0,
+            "max_tokens": self.max_tokens,
+            "records_left_out": self.records_left_out,
+            "cached_prompts": len(self._prompts),
+        }
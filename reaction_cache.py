@@ -0,0 +1,49 @@
+# reaction_cache.py
+import re
+from cache import LRUCache, MISSING
+
+MAX_KEY_LENGTH = 200  # Longer messages are rarely repeated and not worth caching
+
+_WHITESPACE = re.compile(r'\s+')
+_REPEATED_LETTERS = re.compile(r'(\w)\1{2,}')  # "looool" -> "lool"
+_REPEATED_SYMBOLS = re.compile(r'([^\w\s])\1+')  # "sydney!!!" -> "sydney!"
+
+def normalize_reaction_key(content):
+    """Normalize message text so near-identical chatter shares one cache entry.
+
+    Returns None if the message is too long to be worth caching.
+    """
+    key = _WHITESPACE.sub(' ', content.strip().lower())
+    key = _REPEATED_LETTERS.sub(r'\1\1', key)
+    key = _REPEATED_SYMBOLS.sub(r'\1', key)
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return None
+    return key
+
+class ReactionCache:
+    """Remembers the emoji chosen for normalized message text, including "no reaction"."""
+
+    def __init__(self, maxsize=10000, ttl=24 * 3600, negative_ttl=3600):
+        self.negative_ttl = negative_ttl
+        self.cache = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, content):
+        """Return the cached emoji, None for a cached negative result, or MISSING."""
+        key = normalize_reaction_key(content)
+        if key is None:
+            return MISSING
+        return self.cache.get(key)
+
+    def put(self, content, reaction):
+        key = normalize_reaction_key(content)
+        if key is None:
+            return
+        if reaction is None:
+            self.cache.set(key, None, ttl=self.negative_ttl)
+        else:
+            self.cache.set(key, reaction)
+
+    def stats(self):
+        return self.cache.stats()
+
+reaction_cache = ReactionCache()
@@ -0,0 +1,259 @@
+# reaction_model.py
+"""Local emoji-reaction classifier, trained from reactions the API picked in the past.
+
+Messages are hashed into word, word-bigram and character-trigram features and scored by a
+linear softmax model, so picking a reaction is a few array operations instead of a
+completion. The bot only trusts a prediction above REACTION_MODEL_MIN_CONFIDENCE and asks
+the API otherwise; every API answer is appended to the reaction log for the next retrain.
+
+    python reaction_model.py train                       # logs/reactions*.jsonl -> reaction_model.npz
+    python reaction_model.py train --logs 'old/*.jsonl' --epochs 20
+    python reaction_model.py score "lmao sydney" "good morning"
+
+NumPy is listed in requirements.txt; without it the model is not loaded (a warning says so)
+and reactions use the API.
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import threading
+import time
+import zlib
+from config import REACTION_MODEL_PATH, REACTION_MODEL_MIN_CONFIDENCE, REACTION_LOG_PATH, logger
+from reaction_cache import normalize_reaction_key, MAX_KEY_LENGTH
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_DIM = 1 << 15  # Hashed feature space; weights are dim x classes float32
+_BIAS_FEATURE = b'\x00bias'  # Present in every message, so no row is ever empty
+
+def _feature_hashes(text):
+    key = normalize_reaction_key(text[:MAX_KEY_LENGTH]) or ''
+    words = key.split()
+    grams = [_BIAS_FEATURE]
+    grams.extend(b'w' + word.encode('utf-8') for word in words)
+    grams.extend(b'b' + f'{a} {b}'.encode('utf-8') for a, b in zip(words, words[1:]))
+    padded = f' {key} '
+    grams.extend(b'c' + padded[i:i + 3].encode('utf-8') for i in range(len(padded) - 2))
+    return [zlib.crc32(gram) for gram in grams]  # Stable across processes, unlike hash()
+
+def featurize(texts, dim):
+    """Sparse feature rows for texts as (indices, indptr, values), L2-normalized per row."""
+    rows = [np.unique(np.array(_feature_hashes(text), dtype=np.uint32) % dim) for text in texts]
+    lengths = np.array([len(row) for row in rows], dtype=np.int64)
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    indices = np.concatenate(rows).astype(np.int64) if rows else np.zeros(0, dtype=np.int64)
+    values = np.repeat((1.0 / np.sqrt(lengths)).astype(np.float32), lengths)
+    return indices, indptr, values
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=1, keepdims=True)
+    np.exp(logits, out=logits)
+    logits /= logits.sum(axis=1, keepdims=True)
+    return logits
+
+class ReactionModel:
+    """Linear softmax classifier over hashed n-gram features."""
+
+    def __init__(self, classes, weights, bias, dim=DEFAULT_DIM):
+        self.classes = list(classes)
+        self.weights = weights  # (dim, classes) float32
+        self.bias = bias        # (classes,) float32
+        self.dim = dim
+
+    def _probabilities(self, indices, indptr, values):
+        contributions = self.weights[indices] * values[:, None]
+        return _softmax(np.add.reduceat(contributions, indptr[:-1], axis=0) + self.bias)
+
+    def predict_proba(self, texts):
+        """Class probabilities for a batch of messages, shape (len(texts), len(classes))."""
+        if not texts:
+            return np.zeros((0, len(self.classes)), dtype=np.float32)
+        return self._probabilities(*featurize(texts, self.dim))
+
+    def predict_batch(self, texts):
+        """Best emoji and its probability for each message."""
+        probabilities = self.predict_proba(texts)
+        best = probabilities.argmax(axis=1)
+        return [self.classes[i] for i in best], probabilities[np.arange(len(best)), best]
+
+    def predict(self, text):
+        emojis, confidences = self.predict_batch([text])
+        return emojis[0], float(confidences[0])
+
+    @classmethod
+    def train(cls, texts, labels, dim=DEFAULT_DIM, epochs=10, learning_rate=0.5, l2=1e-6, batch_size=256, seed=0):
+        """Fit with mini-batch AdaGrad on the softmax cross-entropy."""
+        classes = sorted(set(labels))
+        class_index = {emoji: i for i, emoji in enumerate(classes)}
+        targets = np.array([class_index[label] for label in labels], dtype=np.int64)
+        indices, indptr, values = featurize(texts, dim)
+        weights = np.zeros((dim, len(classes)), dtype=np.float32)
+        bias = np.log(np.bincount(targets, minlength=len(classes)) / len(targets)).astype(np.float32)  # Start at the prior
+        weight_sq = np.full_like(weights, 1e-8)
+        bias_sq = np.full_like(bias, 1e-8)
+        model = cls(classes, weights, bias, dim)
+        rng = np.random.default_rng(seed)
+        order = np.arange(len(texts))
+        for _ in range(epochs):
+            rng.shuffle(order)
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                starts, ends = indptr[batch], indptr[batch + 1]
+                lengths = ends - starts
+                # Gather the batch's rows out of the full CSR arrays
+                take = np.repeat(starts - np.cumsum(np.concatenate(([0], lengths[:-1]))), lengths) + np.arange(lengths.sum())
+                batch_indices, batch_values = indices[take], values[take]
+                batch_indptr = np.concatenate(([0], np.cumsum(lengths)))
+                delta = model._probabilities(batch_indices, batch_indptr, batch_values)
+                delta[np.arange(len(batch)), targets[batch]] -= 1.0
+                delta /= len(batch)
+                rows = np.repeat(np.arange(len(batch)), lengths)
+                grad = np.zeros_like(weights)
+                np.add.at(grad, batch_indices, delta[rows] * batch_values[:, None])
+                touched = np.unique(batch_indices)
+                grad[touched] += l2 * weights[touched]
+                weight_sq[touched] += grad[touched] ** 2
+                weights[touched] -= learning_rate * grad[touched] / np.sqrt(weight_sq[touched])
+                bias_grad = delta.sum(axis=0)
+                bias_sq += bias_grad ** 2
+                bias -= learning_rate * bias_grad / np.sqrt(bias_sq)
+        return model
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, weights=self.weights, bias=self.bias, classes=np.array(self.classes), dim=self.dim)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls([str(c) for c in data['classes']], data['weights'], data['bias'], int(data['dim']))
+
+def load_reaction_model(path):
+    """The trained model at path, or None if NumPy or the file is missing or unreadable."""
+    if not path or not os.path.exists(path):
+        return None
+    if np is None:
+        logger.warning(f"Found a reaction model at {path}, but NumPy is not installed; reactions will use the API.")
+        return None
+    try:
+        model = ReactionModel.load(path)
+    except Exception as e:
+        logger.warning(f"Could not load the reaction model from {path}: {e}")
+        return None
+    logger.info(f"Loaded reaction model with {len(model.classes)} emojis from {path}.")
+    return model
+
+class ReactionLog:
+    """Buffers (message, emoji) pairs chosen by the API and appends them to a JSONL file on flush."""
+
+    def __init__(self, path):
+        self.path = path
+        self.pending = []
+        self._lock = threading.Lock()        # Guards pending; never held during I/O
+        self._write_lock = threading.Lock()  # Keeps concurrent flushes from interleaving lines
+
+    def record(self, text, emoji):
+        entry = {"ts": round(time.time(), 3), "text": text[:MAX_KEY_LENGTH], "emoji": emoji}
+        with self._lock:
+            self.pending.append(entry)
+
+    def flush(self):
+        """Write out buffered entries. Blocking; run it off the event loop."""
+        with self._lock:
+            entries, self.pending = self.pending, []
+        if not entries:
+            return 0
+        with self._write_lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.writelines(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries)
+        return len(entries)
+
+reaction_log = ReactionLog(REACTION_LOG_PATH)
+
+def read_reaction_logs(pattern):
+    """(text, emoji) pairs from every JSONL file matching pattern, skipping damaged lines."""
+    pairs = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("text") and entry.get("emoji"):
+                    pairs.append((entry["text"], entry["emoji"]))
+    return pairs
+
+def _train_command(args):
+    pairs = read_reaction_logs(args.logs)
+    counts = {}
+    for _, emoji in pairs:
+        counts[emoji] = counts.get(emoji, 0) + 1
+    keep = {emoji for emoji, count in sorted(counts.items(), key=lambda item: -item[1])[:args.max_classes] if count >= args.min_count}
+    pairs = [pair for pair in pairs if pair[1] in keep]
+    if len(keep) < 2:
+        print(f"Need at least two emojis with {args.min_count}+ examples; found {len(keep)} in {args.logs}.", file=sys.stderr)
+        return 1
+    random.Random(args.seed).shuffle(pairs)
+    held_out = pairs[:int(len(pairs) * args.holdout)]
+    training = pairs[len(held_out):]
+    started = time.perf_counter()
+    model = ReactionModel.train([t for t, _ in training], [e for _, e in training], dim=args.dim, epochs=args.epochs, seed=args.seed)
+    print(f"Trained on {len(training)} reactions over {len(keep)} emojis in {time.perf_counter() - started:.1f}s.")
+    if held_out:
+        emojis, confidences = model.predict_batch([t for t, _ in held_out])
+        correct = np.array([predicted == actual for predicted, (_, actual) in zip(emojis, held_out)])
+        confident = confidences >= args.min_confidence
+        print(f"Held-out accuracy {correct.mean():.1%} on {len(held_out)} reactions.")
+        if confident.any():
+            print(
+                f"At confidence >= {args.min_confidence}: {confident.mean():.1%} answered locally, "
+                f"{correct[confident].mean():.1%} of those correct."
+            )
+    model.save(args.out)
+    print(f"Saved {args.out}.")
+    return 0
+
+def _score_command(args):
+    model = ReactionModel.load(args.model)
+    started = time.perf_counter()
+    emojis, confidences = model.predict_batch(args.texts)
+    elapsed = time.perf_counter() - started
+    for text, emoji, confidence in zip(args.texts, emojis, confidences):
+        print(f"{confidence:.2f} {emoji} {text}")
+    print(f"Scored {len(args.texts)} messages in {elapsed * 1e6:.0f} µs.")
+    return 0
+
+def main():
+    if np is None:
+        print("The reaction model needs NumPy (pip install numpy).", file=sys.stderr)
+        return 1
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    train = commands.add_parser("train", help="fit a model from reaction logs")
+    train.add_argument("--logs", default="logs/reactions*.jsonl", help="glob of JSONL reaction logs")
+    train.add_argument("--out", default=REACTION_MODEL_PATH)
+    train.add_argument("--dim", type=int, default=DEFAULT_DIM, help="hashed feature space size")
+    train.add_argument("--epochs", type=int, default=10)
+    train.add_argument("--min-count", type=int, default=5, help="drop emojis with fewer examples")
+    train.add_argument("--max-classes", type=int, default=64, help="keep only the most common emojis")
+    train.add_argument("--holdout", type=float, default=0.1, help="fraction held out for evaluation")
+    train.add_argument("--min-confidence", type=float, default=REACTION_MODEL_MIN_CONFIDENCE)
+    train.add_argument("--seed", type=int, default=0)
+    score = commands.add_parser("score", help="score messages with a saved model")
+    score.add_argument("texts", nargs="+")
+    score.add_argument("--model", default=REACTION_MODEL_PATH)
+    args = parser.parse_args()
+    return _train_command(args) if args.command == "train" else _score_command(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
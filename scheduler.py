@@ -0,0 +1,238 @@
+# scheduler.py
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from cache import LRUCache, MISSING
+from config import (
+    SCHEDULER_CONCURRENCY,
+    SCHEDULER_MAX_QUEUE,
+    SCHEDULER_SHED_DEPTH,
+    RATE_LIMIT_USER,
+    RATE_LIMIT_CHANNEL,
+    RATE_LIMIT_GUILD
+)
+
+# Lower value runs first
+PRIORITY_DIRECT = 0    # Mentions and DMs
+PRIORITY_TRIGGER = 1   # Trigger-word replies
+PRIORITY_RANDOM = 2    # reply_probability replies
+PRIORITY_REACTION = 3  # reaction_probability reactions
+
+PRIORITY_NAMES = {
+    PRIORITY_DIRECT: "direct",
+    PRIORITY_TRIGGER: "trigger",
+    PRIORITY_RANDOM: "random",
+    PRIORITY_REACTION: "reaction",
+}
+
+# Fraction of each bucket that optional work must leave untouched, so chatter that only
+# earns random replies and reactions can't use up the tokens a mention would need
+_BUCKET_RESERVE = {
+    PRIORITY_DIRECT: 0.0,
+    PRIORITY_TRIGGER: 0.0,
+    PRIORITY_RANDOM: 0.5,
+    PRIORITY_REACTION: 0.5,
+}
+
+class WorkDropped(Exception):
+    """Raised instead of running work that was rate limited or shed under backlog."""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate_per_minute, capacity):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def available(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+class _Limiter:
+    """Token buckets for one scope (user, channel or guild), created on first use."""
+
+    def __init__(self, name, rate_per_minute, burst, maxsize=10000):
+        self.name = name
+        self.rate_per_minute = rate_per_minute
+        self.burst = burst
+        self.buckets = LRUCache(maxsize=maxsize)
+
+    def bucket(self, key):
+        bucket = self.buckets.get(key)
+        if bucket is MISSING:
+            bucket = TokenBucket(self.rate_per_minute, self.burst)
+            self.buckets.set(key, bucket)
+        return bucket
+
+class _Waiter:
+    __slots__ = ('priority', 'future', 'queued', 'buckets')
+
+    def __init__(self, priority, future, buckets):
+        self.priority = priority
+        self.future = future
+        self.queued = time.monotonic()
+        self.buckets = buckets  # Charged on admission to the queue; refunded if it never runs
+
+class WorkScheduler:
+    """Priority admission for generation work, with per-user, per-channel and per-guild rate limits.
+
+    At most `concurrency` jobs hold a slot at once; the rest wait in a priority queue, direct
+    mentions and DMs first and random reactions last. Each job spends one token from its user,
+    channel and guild buckets, charged only once it is admitted and refunded if it is evicted or
+    cancelled before it runs. Once `shed_depth` jobs are waiting, random replies and reactions
+    are dropped on arrival. When the queue is full, a new job evicts the lowest-priority waiter
+    if it outranks it.
+    """
+
+    def __init__(self, concurrency, max_queue, shed_depth, user_rate, channel_rate, guild_rate):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.shed_depth = shed_depth
+        self.limiters = [
+            _Limiter("user", *user_rate),
+            _Limiter("channel", *channel_rate),
+            _Limiter("guild", *guild_rate),
+        ]
+        self.running = 0
+        self._queue = []  # heap of (priority, seq, _Waiter)
+        self._seq = itertools.count()
+        self.waiting = 0
+        self.waits = {priority: deque(maxlen=500) for priority in PRIORITY_NAMES}
+        self.admitted = {priority: 0 for priority in PRIORITY_NAMES}
+        self.dropped = {}  # reason -> count
+
+    def _drop(self, reason):
+        self.dropped[reason] = self.dropped.get(reason, 0) + 1
+        return WorkDropped(reason)
+
+    def _limited(self, priority, buckets):
+        """Name of the first scope without a token to spare for this priority, or None."""
+        now = time.monotonic()
+        reserve = _BUCKET_RESERVE[priority]
+        for limiter, bucket in zip(self.limiters, buckets):
+            if bucket.available(now) < 1.0 + reserve * bucket.capacity:
+                return limiter.name
+        return None
+
+    @staticmethod
+    def _charge(buckets, amount=1.0):
+        for bucket in buckets:
+            bucket.tokens = min(bucket.capacity, bucket.tokens - amount)
+
+    def _evict_lowest(self, priority):
+        """Drop the lowest-priority (then newest) waiter if it ranks below `priority`."""
+        live = [entry for entry in self._queue if not entry[2].future.done()]
+        if not live:
+            return False
+        victim = max(live, key=lambda entry: (entry[0], entry[1]))
+        if victim[0] <= priority:
+            return False
+        victim[2].future.set_exception(self._drop(f"evicted_{PRIORITY_NAMES[victim[0]]}"))
+        self._charge(victim[2].buckets, -1.0)
+        self._queue.remove(victim)
+        heapq.heapify(self._queue)
+        self.waiting -= 1
+        return True
+
+    async def acquire(self, priority, user_id, channel_id, guild_id):
+        """Wait for a slot; raises WorkDropped if the job is rate limited or shed."""
+        buckets = [limiter.bucket(key) for limiter, key in zip(self.limiters, (user_id, channel_id, guild_id))]
+        limited = self._limited(priority, buckets)
+        if limited is not None:
+            raise self._drop(f"{limited}_rate")
+        if self.running < self.concurrency and not self.waiting:
+            self._charge(buckets)
+            self.running += 1
+            self.admitted[priority] += 1
+            self.waits[priority].append(0.0)
+            return
+        if self.waiting >= self.shed_depth and priority >= PRIORITY_RANDOM:
+            raise self._drop("backlog")
+        if self.waiting >= self.max_queue and not self._evict_lowest(priority):
+            raise self._drop("queue_full")
+
+        self._charge(buckets)
+        waiter = _Waiter(priority, asyncio.get_running_loop().create_future(), buckets)
+        heapq.heappush(self._queue, (priority, next(self._seq), waiter))
+        self.waiting += 1
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.cancelled():
+                self.waiting -= 1  # The stale heap entry is skipped in release()
+                self._charge(buckets, -1.0)
+            elif waiter.future.exception() is None:
+                self.release()  # The slot was handed to us just as we were cancelled; pass it on
+            raise
+        self.admitted[priority] += 1
+        self.waits[priority].append(time.monotonic() - waiter.queued)
+
+    def release(self):
+        while self._queue:
+            _, _, waiter = heapq.heappop(self._queue)
+            if waiter.future.done():
+                continue  # Cancelled or evicted while queued
+            self.waiting -= 1
+            waiter.future.set_result(None)  # Hand our slot straight to the next waiter
+            return
+        self.running -= 1
+
+    def slot(self, priority, user_id, channel_id, guild_id):
+        """Async context manager holding a slot for the duration of one job."""
+        return _Slot(self, priority, (user_id, channel_id, guild_id))
+
+    def stats(self):
+        depth = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, waiter in self._queue:
+            if not waiter.future.done():
+                depth[PRIORITY_NAMES[priority]] += 1
+        waits = {}
+        for priority, samples in self.waits.items():
+            if samples:
+                ordered = sorted(samples)
+                waits[PRIORITY_NAMES[priority]] = {
+                    "avg": sum(ordered) / len(ordered),
+                    "p95": ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+                }
+        return {
+            "running": self.running,
+            "waiting": self.waiting,
+            "depth": depth,
+            "wait_seconds": waits,
+            "admitted": {PRIORITY_NAMES[p]: n for p, n in self.admitted.items()},
+            "dropped": dict(self.dropped),
+        }
+
+class _Slot:
+    __slots__ = ('scheduler', 'priority', 'keys')
+
+    def __init__(self, scheduler, priority, keys):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.keys = keys
+
+    async def __aenter__(self):
+        await self.scheduler.acquire(self.priority, *self.keys)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.scheduler.release()
+        return False
+
+scheduler = WorkScheduler(
+    SCHEDULER_CONCURRENCY,
+    SCHEDULER_MAX_QUEUE,
+    SCHEDULER_SHED_DEPTH,
+    RATE_LIMIT_USER,
+    RATE_LIMIT_CHANNEL,
+    RATE_LIMIT_GUILD
+)
@@ -0,0 +1,90 @@
+# streaming.py
+import contextlib
+import time
+import discord
+from config import STREAM_FIRST_POST_CHARS, STREAM_EDIT_INTERVAL_SECONDS, logger
+from helpers import RefusalScanner
+
+DISCORD_MESSAGE_LIMIT = 2000
+MAX_EDIT_INTERVAL_SECONDS = 10.0
+
+class StreamResult:
+    __slots__ = ('content', 'sent', 'refused', 'failed')
+
+    def __init__(self, content, sent, refused=False, failed=False):
+        self.content = content  # Rendered text currently shown (or to show) on Discord
+        self.sent = sent  # The posted discord.Message, or None if nothing was posted
+        self.refused = refused
+        self.failed = failed  # The completion stream broke off
+
+    @property
+    def usable(self):
+        return not self.refused and not self.failed and bool(self.content)
+
+async def stream_reply(message, deltas, render, first_post_chars=STREAM_FIRST_POST_CHARS, edit_interval=STREAM_EDIT_INTERVAL_SECONDS, on_first_post=None):
+    """Post a reply to message as soon as enough of the stream arrives, then edit it in batches.
+
+    render turns the raw completion so far into the Discord message text (custom-name strip,
+    prefix, mentions, 2000-char cap). The stream stops early once the rendered text hits the
+    Discord limit, or when a refusal shows up so the caller can escalate. Errors from the
+    completion stream are reported as failed; Discord errors propagate. on_first_post is
+    called just before anything is posted.
+    """
+    text = ''
+    sent = None
+    shown = ''
+    last_edit = 0.0
+    scanner = RefusalScanner()
+
+    async with contextlib.aclosing(deltas) as stream:
+        while True:
+            try:
+                delta = await anext(stream)
+            except StopAsyncIteration:
+                break
+            except Exception as e:
+                logger.error(f"Completion stream failed: {e}", exc_info=True)
+                return StreamResult(shown, sent, failed=True)
+            text += delta
+            if scanner.feed(text):
+                logger.warning("Refusal detected in streamed reply.")
+                return StreamResult(shown, sent, refused=True)
+            if sent is None and len(text) < first_post_chars:
+                continue
+            now = time.monotonic()
+            near_limit = len(text) >= DISCORD_MESSAGE_LIMIT - 100
+            if sent is not None and now - last_edit < edit_interval and not near_limit:
+                continue
+            rendered = render(text)
+            if not rendered.strip():
+                continue
+            if sent is None:
+                if on_first_post is not None:
+                    on_first_post()
+                sent = await message.reply(rendered, mention_author=False)
+                shown = rendered
+                last_edit = now
+            elif rendered != shown:
+                try:
+                    await sent.edit(content=rendered)
+                    shown = rendered
+                except discord.HTTPException as e:
+                    if e.status != 429:
+                        raise
+                    edit_interval = min(edit_interval * 2, MAX_EDIT_INTERVAL_SECONDS)
+                    logger.warning(f"Rate limited while editing streamed reply; edit interval now {edit_interval}s.")
+                last_edit = time.monotonic()
+            if len(rendered) >= DISCORD_MESSAGE_LIMIT:
+                # Already truncated to the limit; the rest of the stream can never be shown
+                break
+
+    rendered = render(text)
+    if not rendered.strip():
+        return StreamResult('', sent)
+    if sent is None:
+        if on_first_post is not None:
+            on_first_post()
+        sent = await message.reply(rendered, mention_author=False)
+    elif rendered != shown:
+        await sent.edit(content=rendered)
+    return StreamResult(rendered, sent)
@@ -0,0 +1,26 @@
+# tokens.py
+"""Cheap token estimates for context budgeting.
+
+The OpenPipe models don't expose their tokenizer, so counts are estimated from UTF-8 size:
+about four bytes per token for English chat, with emoji and non-Latin text (more bytes per
+character) naturally counting heavier. Each message also pays a small fixed overhead for
+its role and separators.
+"""
+
+BYTES_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+TRUNCATION_MARKER = ' [...]'
+
+def estimate_tokens(nbytes):
+    """Estimated tokens for one message whose content is nbytes of UTF-8."""
+    return MESSAGE_OVERHEAD_TOKENS + (nbytes + BYTES_PER_TOKEN - 1) // BYTES_PER_TOKEN
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text so its message fits in max_tokens, marking the cut. Short text is returned as is."""
+    max_bytes = (max_tokens - MESSAGE_OVERHEAD_TOKENS) * BYTES_PER_TOKEN
+    encoded = text.encode('utf-8')
+    if len(encoded) <= max_bytes:
+        return text
+    keep = max(0, max_bytes - len(TRUNCATION_MARKER))
+    # errors='ignore' drops a multi-byte character split by the cut
+    return encoded[:keep].decode('utf-8', errors='ignore').rstrip() + TRUNCATION_MARKER
@@ -0,0 +1,90 @@
+# triggers.py
+import re
+from functools import lru_cache
+from config import logger
+from helpers import trie_regex
+from database import load_trigger_words
+
+TRIGGER_NONE = None
+TRIGGER_NORMAL = 'normal'
+TRIGGER_EXPENSIVE = 'expensive'
+
+MAX_TRIGGER_WORD_LENGTH = 50
+MAX_TRIGGER_WORDS_PER_GUILD = 500
+
+class TriggerMatcher:
+    """A compiled matcher for one set of normal and expensive trigger words.
+
+    All words share a single prefix-trie regex, so a message is classified in one pass over
+    its text. Normal triggers win over expensive ones, as they did with the two separate checks.
+    """
+
+    __slots__ = ('pattern', 'kinds')
+
+    def __init__(self, normal_words, expensive_words):
+        self.kinds = {word: TRIGGER_EXPENSIVE for word in expensive_words}
+        self.kinds.update((word, TRIGGER_NORMAL) for word in normal_words)
+        if self.kinds:
+            # Longest alternatives come first in the trie, so a match is always a whole word from the set
+            self.pattern = re.compile(r'\b(' + trie_regex(self.kinds) + r')\b')
+        else:
+            self.pattern = None
+
+    def classify(self, content):
+        """Return TRIGGER_NORMAL, TRIGGER_EXPENSIVE or TRIGGER_NONE for a message."""
+        if self.pattern is None:
+            return TRIGGER_NONE
+        result = TRIGGER_NONE
+        for match in self.pattern.finditer(content.lower()):
+            kind = self.kinds.get(match.group(1))
+            if kind == TRIGGER_NORMAL:
+                return TRIGGER_NORMAL
+            result = kind or result
+        return result
+
+@lru_cache(maxsize=256)
+def _get_matcher(normal_words, expensive_words):
+    # Keyed on the word sets, so guilds without custom words share the default matcher
+    return TriggerMatcher(normal_words, expensive_words)
+
+def normalize_trigger_word(word):
+    """Lowercase and trim a trigger word, or return None if it is empty or too long."""
+    word = word.strip().lower()
+    if not word or len(word) > MAX_TRIGGER_WORD_LENGTH:
+        return None
+    return word
+
+class TriggerRegistry:
+    """Per-guild trigger matchers built from the default words plus the guild's stored words.
+
+    Matchers are compiled once per distinct word set and only rebuilt when a guild's
+    words change through invalidate().
+    """
+
+    def __init__(self, default_words, default_expensive_words):
+        self.default_words = frozenset(normalize_trigger_word(w) for w in default_words)
+        self.default_expensive_words = frozenset(normalize_trigger_word(w) for w in default_expensive_words)
+        self._matchers = {}  # guild_id -> TriggerMatcher
+
+    async def matcher_for(self, guild_id):
+        matcher = self._matchers.get(guild_id)
+        if matcher is None:
+            normal = set(self.default_words)
+            expensive = set(self.default_expensive_words)
+            if guild_id != "DM":
+                for word, is_expensive in await load_trigger_words(guild_id):
+                    (expensive if is_expensive else normal).add(word)
+            matcher = _get_matcher(frozenset(normal), frozenset(expensive))
+            self._matchers[guild_id] = matcher
+            logger.debug(f"Built trigger matcher for guild {guild_id} with {len(matcher.kinds)} words.")
+        return matcher
+
+    async def classify(self, guild_id, content):
+        return (await self.matcher_for(guild_id)).classify(content)
+
+    def invalidate(self, guild_id):
+        self._matchers.pop(guild_id, None)
+
+    def clear(self):
+        """Forget every guild's matcher, e.g. after another process changed stored words."""
+        self._matchers.clear()